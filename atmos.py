@@ -0,0 +1,236 @@
+""" atmos
+the atmosphere: the layered 1976 US / ISA standard atmosphere, fitted to
+the launch site, and tables of it for the integrators
+
+The standard atmosphere is a stack of layers, each with a constant lapse
+rate in geopotential altitude.  The base temperature and pressure of every
+layer are worked out once, at import, so any altitude is a single layer
+formula away.  The functions take metres above sea level and accept
+numpy arrays as well as floats.
+
+A site is fitted as ISA+dT: the temperature everywhere is the standard one
+shifted by the difference at the site, and the pressure falls off as the
+standard one does from the site's barometer.  So density and the speed of
+sound at the pad are exactly those of the site readings, and the layers
+(tropopause at 11km, ...) sit at their true altitudes above sea level.
+
+For the integrators, an AtmosTable holds density and the speed of sound
+against altitude above the pad for one site, one row per metre, linear in
+between (within about 1e-9 of the model).  Rows are filled in blocks as a
+flight climbs into them and tables are shared by flights from the same site.
+"""
+
+import math
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+import rasp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+G0 = 9.80665            # m/s^2
+R_AIR = 287.05287       # J / (kg K), the ISA value
+T0 = 288.15             # K at sea level
+P0 = 101325.0           # Pa at sea level
+EARTH_R = 6356766.0     # m, for geopotential altitude
+
+# (base geopotential altitude m, lapse rate K/m) up to the top of the model
+LAYERS = (
+    (0.0, -0.0065),
+    (11000.0, 0.0),
+    (20000.0, 0.0010),
+    (32000.0, 0.0028),
+    (47000.0, 0.0),
+    (51000.0, -0.0028),
+    (71000.0, -0.0020),
+    (84852.0, 0.0),       # on up, isothermal
+)
+
+
+def _layer_constants():
+    """ base temperature and pressure of each layer """
+
+    temps, presses = [T0], [P0]
+    for (h, lapse), (h_next, _) in zip(LAYERS, LAYERS[1:]):
+        t, p = temps[-1], presses[-1]
+        t_next = t + lapse * (h_next - h)
+        if lapse:
+            p_next = p * (t / t_next) ** (G0 / (R_AIR * lapse))
+        else:
+            p_next = p * math.exp(-G0 * (h_next - h) / (R_AIR * t))
+        temps.append(t_next)
+        presses.append(p_next)
+
+    return temps, presses
+
+
+BASES = [h for h, _ in LAYERS]
+LAPSES = [lapse for _, lapse in LAYERS]
+BASE_TEMPS, BASE_PRESSES = _layer_constants()
+
+TABLE_STEP = 1.0      # meters between rows
+TABLE_TOP = 86000.0   # meters above the pad covered by a table
+TABLE_BLOCK = 512     # rows filled in at a time
+TABLE_CACHE = 32      # site tables kept
+
+
+def geopotential(z):
+    """ geopotential altitude of geometric altitude z """
+    return EARTH_R * z / (EARTH_R + z)
+
+
+def temperature(z):
+    """ standard temperature (K) at z meters above sea level """
+
+    if np is not None and isinstance(z, np.ndarray):
+        h = geopotential(z)
+        i = np.clip(np.searchsorted(BASES, h, side='right') - 1, 0, len(BASES) - 1)
+        return np.take(BASE_TEMPS, i) + np.take(LAPSES, i) * (h - np.take(BASES, i))
+
+    h = geopotential(z)
+    i = max(bisect_right(BASES, h) - 1, 0)
+    return BASE_TEMPS[i] + LAPSES[i] * (h - BASES[i])
+
+
+def pressure(z):
+    """ standard pressure (Pa) at z meters above sea level """
+
+    if np is not None and isinstance(z, np.ndarray):
+        h = geopotential(z)
+        i = np.clip(np.searchsorted(BASES, h, side='right') - 1, 0, len(BASES) - 1)
+        tb, pb, lapse = np.take(BASE_TEMPS, i), np.take(BASE_PRESSES, i), np.take(LAPSES, i)
+        dh = h - np.take(BASES, i)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sloped = pb * (tb / (tb + lapse * dh)) ** (G0 / (R_AIR * lapse))
+        return np.where(lapse == 0.0, pb * np.exp(-G0 * dh / (R_AIR * tb)), sloped)
+
+    h = geopotential(z)
+    i = max(bisect_right(BASES, h) - 1, 0)
+    tb, pb, lapse, dh = BASE_TEMPS[i], BASE_PRESSES[i], LAPSES[i], h - BASES[i]
+    if lapse:
+        return pb * (tb / (tb + lapse * dh)) ** (G0 / (R_AIR * lapse))
+    return pb * math.exp(-G0 * dh / (R_AIR * tb))
+
+
+def density(z):
+    """ standard density (kg/m^3) at z meters above sea level """
+    return pressure(z) / (R_AIR * temperature(z))
+
+
+def standard_press(alt):
+    """ standard barometer (inHg) at alt meters above sea level """
+    return pressure(alt) / rasp.IN2PASCAL
+
+
+class Site:
+    """ the standard atmosphere fitted to a launch site's altitude, temperature and barometer """
+
+    def __init__(self, site_alt, base_temp, rho_0):
+        self.site_alt = site_alt
+        self.base_temp = base_temp
+        self.rho_0 = rho_0
+        self.dtemp = base_temp - temperature(site_alt)
+        self.press_0 = pressure(site_alt)
+
+    def temperature(self, y):
+        """ temperature y meters above the pad """
+        return temperature(self.site_alt + y) + self.dtemp
+
+    def density(self, y):
+        """ air density y meters above the pad """
+        return self.rho_0 * pressure(self.site_alt + y) / self.press_0 * self.base_temp / self.temperature(y)
+
+
+def sound_speed(temp):
+    return math.sqrt(rasp.MACH_CONST * temp)
+
+
+class AtmosTable:
+    """ density and speed of sound against altitude above the pad for one site """
+
+    def __init__(self, site, temp_correction, step=TABLE_STEP):
+        self.site = site
+        self.temp_correction = temp_correction
+        self.step = step
+        self.inv_step = 1.0 / step
+        self.top = int(TABLE_TOP / step)  # last row, the model is used above it
+        self.mach_0 = sound_speed(site.base_temp)
+
+        # row i is the value at i * step, d* is the change to row i + 1
+        self.rho = array('d')
+        self.drho = array('d')
+        self.mach = array('d')
+        self.dmach = array('d')
+        self.rows = 0  # rows with a slope
+
+    def exact(self, y):
+        """ (air density, Mach 1) from the model """
+
+        if self.temp_correction:
+            return self.site.density(y), sound_speed(self.site.temperature(y))
+
+        return self.site.density(y), self.mach_0
+
+    def _grow(self, i):
+        """ fill in rows until row i has a slope """
+
+        last = min(max(i + 1, self.rows + TABLE_BLOCK), self.top)
+        if not self.rho:
+            rho, mach = self.exact(0.0)
+            self.rho.append(rho)
+            self.mach.append(mach)
+
+        for j in range(len(self.rho), last + 1):
+            rho, mach = self.exact(j * self.step)
+            self.drho.append(rho - self.rho[-1])
+            self.dmach.append(mach - self.mach[-1])
+            self.rho.append(rho)
+            self.mach.append(mach)
+
+        self.rows = len(self.drho)
+
+    def lookup(self, y):
+        """ (air density, Mach 1) at y meters above the pad """
+
+        f = y * self.inv_step
+        i = int(f)
+        if i >= self.rows or y < 0.0:
+            if y < 0.0 or i >= self.top:
+                return self.exact(y)
+            self._grow(i)
+
+        f -= i
+        return self.rho[i] + f * self.drho[i], self.mach[i] + f * self.dmach[i]
+
+
+_tables = OrderedDict()
+
+
+def table(site_alt, base_temp, rho_0, temp_correction):
+    """ the AtmosTable of a site, shared by all flights from it """
+
+    key = (site_alt, base_temp, rho_0, bool(temp_correction))
+    atm = _tables.get(key)
+    if atm is None:
+        atm = _tables[key] = AtmosTable(Site(site_alt, base_temp, rho_0), temp_correction)
+        if len(_tables) > TABLE_CACHE:
+            _tables.popitem(last=False)
+    else:
+        _tables.move_to_end(key)
+
+    return atm
+
+
+def density_array(site_alt, base_temp, rho_0, y):
+    """ Site.density for arrays of lanes """
+
+    return rho_0 * pressure(site_alt + y) / pressure(site_alt) * base_temp / temperature_array(site_alt, base_temp, y)
+
+
+def temperature_array(site_alt, base_temp, y):
+    """ Site.temperature for arrays of lanes """
+    return temperature(site_alt + y) + (base_temp - temperature(site_alt))
@@ -0,0 +1,295 @@
+""" bench
+benchmarks of the simulation hot paths, with a saved baseline to catch
+regressions
+
+Each benchmark is timed as the best of a few runs and then run once more
+under tracemalloc for its peak memory.  The rate is work per second in
+the benchmark's own unit (Euler steps, motors parsed, thrust lookups,
+launches, table rows).
+
+    python bench.py                       run and report
+    python bench.py -o base.json          ... and save the results
+    python bench.py -b base.json          ... and exit 1 on any benchmark slower,
+                                              or bigger, than the baseline by
+                                              more than --threshold
+
+Timings of the same code swing by 20-35% from run to run on a busy or
+single CPU machine, so the default threshold is 50% and a benchmark that
+looks slower is measured again, up to --retries times, before it counts as
+a regression.  Run with more repeats and a lower threshold on a quiet
+machine.
+
+The Python loop is what is timed: RASP_NOJIT is set unless --jit is given.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+
+import nc
+import rasp
+import raspinfo
+
+VERSION = '1.0'
+
+ENG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rasp.eng')
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test')
+
+
+def load_deck(name):
+    """ a deck from test/ up to its first OutFile, flying the motors of ENG_FILE """
+
+    with open(os.path.join(TEST_DIR, name)) as fp:
+        text = fp.read()
+    text = text[:text.index('OutFile')]
+    return text.replace('../rasp.eng', ENG_FILE)
+
+
+# the decks the benchmarks fly, read from test/ so they match what the tests fly
+AIRFRAME = 'test.ovi'
+TWO_STAGE = 'golden2.ovi'
+
+
+class Workdir:
+    """ a scratch directory for decks and the files LAUNCH writes """
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='raspbench')
+
+    def deck(self, name, source, tail='', coast=None, motor=None):
+        """ the test/ deck source, coasting coast seconds on motor, followed by tail """
+
+        text = load_deck(source)
+        if coast is not None:
+            text = re.sub(r'CoastTime\s+\S+', 'CoastTime %g' % coast, text)
+        if motor is not None:
+            text += "MotorName %s\n" % motor
+        fname = os.path.join(self.path, name)
+        with open(fname, 'w') as fp:
+            fp.write(text + tail)
+        return fname
+
+    def flight(self, name, source, record='summary', **kw):
+        rkt = nc.load_rocket(self.deck(name, source, "Launch\n", **kw))
+        flight = rkt.as_flight()
+        flight.record = record
+        flight.compiled = not os.environ.get('RASP_NOJIT')
+        return flight
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def steps(flight):
+    """ Euler steps in a flight """
+    return sum(1 for _ in rasp.simulate_stream(flight)) - 1
+
+
+def bench_calc(work, deck, **kw):
+    flight = work.flight('calc.ovi', deck, **kw)
+    return lambda: rasp.calc(flight), steps(flight), 'steps'
+
+
+def bench_load_engine(work):
+    motors = len(raspinfo.load_engine(ENG_FILE))
+    return lambda: raspinfo.load_engine(ENG_FILE), motors, 'motors'
+
+
+def bench_get_thrust(work):
+    engine = raspinfo.find_motor(ENG_FILE, 'G40')
+    n = 100000
+    times = [i * engine.t2() * 1.2 / n for i in range(n)]
+
+    def run():
+        get_thrust = engine.get_thrust
+        for t in times:
+            get_thrust(t)
+
+    return run, n, 'lookups'
+
+
+def bench_batch_flite(work):
+    tail = "Verbose\nOutFile b1\nLaunch\nMotorName G40\nOutFile b2\nLaunch\n"
+    deck = work.deck('batch.ovi', AIRFRAME, tail, coast=90, motor='F50')
+
+    def run():
+        cwd = os.getcwd()
+        os.chdir(work.path)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                nc.batch_flite(deck)
+        finally:
+            os.chdir(cwd)
+
+    return run, 2, 'launches'
+
+
+def bench_display(work):
+    flight = work.flight('display.ovi', AIRFRAME, record='full', coast=90, motor='G40')
+    results = rasp.calc(flight)
+
+    def run():
+        results.display(io.StringIO(), verbose=True)
+
+    fp = io.StringIO()
+    results.display(fp, verbose=True)
+    return run, fp.getvalue().count('\n'), 'rows'
+
+
+BENCHMARKS = (
+    ('calc_short', lambda w: bench_calc(w, AIRFRAME, coast=0, motor='F50')),
+    ('calc_coast90', lambda w: bench_calc(w, AIRFRAME, coast=90, motor='G40')),
+    ('calc_two_stage', lambda w: bench_calc(w, TWO_STAGE)),
+    ('load_engine', bench_load_engine),
+    ('get_thrust', bench_get_thrust),
+    ('batch_flite', bench_batch_flite),
+    ('display', bench_display),
+)
+
+
+def measure(run, repeat):
+    """ best time of repeat runs, and the peak memory of one more (bytes) """
+
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def run_all(repeat=5, only=None, names=None):
+    """
+    {name: {seconds, rate, unit, peak_kb}} of every benchmark whose name
+    contains only, or is in names
+    """
+
+    work = Workdir()
+    results = {}
+    try:
+        for name, setup in BENCHMARKS:
+            if only and only not in name or names is not None and name not in names:
+                continue
+            run, amount, unit = setup(work)
+            seconds, peak = measure(run, repeat)
+            results[name] = dict(seconds=seconds, rate=amount / seconds, unit=unit, peak_kb=peak / 1024)
+    finally:
+        work.close()
+
+    return results
+
+
+def environment():
+    try:
+        import numpy
+        np_version = numpy.__version__
+    except ImportError:
+        np_version = None
+
+    return dict(python=platform.python_version(), machine=platform.machine(), numpy=np_version,
+                jit=not os.environ.get('RASP_NOJIT'))
+
+
+def regressions(results, baseline, threshold):
+    """ (name, what, baseline, now) for each benchmark worse than the baseline by more than threshold """
+
+    worse = []
+    for name, now in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if now['rate'] < base['rate'] / (1 + threshold):
+            worse.append((name, 'rate', base['rate'], now['rate']))
+        if now['peak_kb'] > base['peak_kb'] * (1 + threshold):
+            worse.append((name, 'peak_kb', base['peak_kb'], now['peak_kb']))
+
+    return worse
+
+
+def print_results(fp, results, baseline=None):
+    print("%c %-16s %10s %14s %-8s %10s %8s" % (
+          rasp.CH1, "Benchmark", "Best (ms)", "Rate (/sec)", "Unit", "Peak (KB)", "vs base"), file=fp)
+
+    for name, r in results.items():
+        base = (baseline or {}).get(name)
+        change = "%+7.1f%%" % ((r['rate'] / base['rate'] - 1) * 100) if base else ""
+        print("  %-16s %10.2f %14.0f %-8s %10.1f %8s" % (
+              name, r['seconds'] * 1e3, r['rate'], r['unit'], r['peak_kb'], change), file=fp)
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='bench', description=f'RASP benchmarks (v{VERSION})')
+    parser.add_argument('-r', '--repeat', type=int, default=9, help="runs per benchmark, the best is kept")
+    parser.add_argument('-k', '--only', help="only benchmarks whose name contains this")
+    parser.add_argument('-o', '--output', help="save the results to this JSON file")
+    parser.add_argument('-b', '--baseline', help="JSON file of earlier results to compare with")
+    parser.add_argument('-t', '--threshold', type=float, default=0.5,
+                        help="fraction slower (or bigger) than the baseline that fails")
+    parser.add_argument('--retries', type=int, default=2,
+                        help="times a benchmark that looks slower is measured again")
+    parser.add_argument('--jit', action='store_true', help="let calc use the compiled kernel")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    if not args.jit:
+        os.environ['RASP_NOJIT'] = '1'
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)['benchmarks']
+
+    results = run_all(args.repeat, args.only)
+
+    # noise, not a regression, if another run comes in under the threshold
+    for _ in range(args.retries if baseline else 0):
+        worse = {name for name, *_ in regressions(results, baseline, args.threshold)}
+        if not worse:
+            break
+        for name, again in run_all(args.repeat, names=worse).items():
+            if again['seconds'] < results[name]['seconds']:
+                results[name] = again
+
+    print_results(sys.stdout, results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(dict(version=VERSION, environment=environment(), benchmarks=results), fp, indent=2)
+
+    if baseline:
+        worse = regressions(results, baseline, args.threshold)
+        for name, what, base, now in worse:
+            print("%c REGRESSION %s %s: %.1f -> %.1f" % (rasp.CH1, name, what, base, now))
+        if worse:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+""" diverge
+drag divergence models: the factor the subsonic Cd of a rocket is
+multiplied by at a given Mach number
+
+A DragModel tabulates its curve once, on a fine Mach grid, and the
+integrators read the table: one division, a compare and, above the flat
+subsonic part, a linear interpolation, whatever the shape of the curve.
+Past the end of the grid the curve itself is evaluated.
+
+The built in models are the M,C&B sharp and round nose curves (see the
+notes at the top of rasp.py), one per nose type.  A rocket can carry its
+own model instead, e.g. a measured Cd(Mach) curve read from a CSV file of
+"mach, cd" rows.  The curve is scaled by its first (lowest Mach) Cd, so
+it reshapes the CD of each stage rather than replacing it.
+"""
+
+import os
+import csv
+import math
+from bisect import bisect_right
+
+import rasp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MACH_STEP = 0.001   # Mach between table rows
+MACH_TOP = 2.0      # the built in curves are flat beyond this
+
+
+def sharp(mach_number):
+    """ sharp noses: ogive and conic """
+
+    if mach_number <= 0.9:
+        return 1.0
+    if mach_number <= 1.05:
+        diverge = mach_number - 0.9
+        return 1.0 + 35.5 * diverge * diverge
+    if mach_number < 2.0:
+        return 1.27 + 0.53 * math.exp(-5.2 * (mach_number - 1.05))
+    return 1.27
+
+
+def rounded(mach_number):
+    """ round noses: elliptic, parabolic and blunt """
+
+    if mach_number <= 0.9:
+        return 1.0
+    if mach_number <= 1.2:
+        return 1.0 + 4.88 * (mach_number - 0.9) ** 1.1
+    if mach_number < 2.0:
+        return 2.0 + 0.30 * math.exp(-5.75 * (mach_number - 1.2))
+    return 2.0
+
+
+class DragModel:
+    """
+    a tabulated drag divergence curve.  func gives the factor at a Mach
+    number, flat is the Mach number up to which it is 1.0 (the fast path).
+    bias(mach_1, velocity) is the factor at velocity, from the table.
+    """
+
+    def __init__(self, name, func, top=MACH_TOP, flat=None, step=MACH_STEP):
+        self.name = name
+        self.func = func
+        self.flat = flat if flat is not None else -math.inf
+        self.step = step
+        self.inv_step = 1.0 / step
+
+        # row i runs from just above i * step to just below the next row, so
+        # a jump in the curve (the branches do not quite meet) is not smeared
+        rows = int(round(top / step))
+        self.table = [func(math.nextafter(i * step, math.inf)) for i in range(rows)]
+        self.slopes = [func(math.nextafter((i + 1) * step, -math.inf)) - self.table[i] for i in range(rows)]
+        self.rows = rows
+        self.grid = None  # numpy copies of the table, see factor_array()
+
+        self.bias = self._lookup()
+
+    def __str__(self):
+        return self.name
+
+    def factor(self, mach_number):
+        """ the exact curve """
+        return self.func(mach_number)
+
+    def _lookup(self):
+        """ bias(mach_1, velocity), the factor from the table, with everything it reads bound in """
+
+        flat, inv_step, rows, func = self.flat, self.inv_step, self.rows, self.func
+        table, slopes = self.table, self.slopes
+
+        def bias(mach_1, velocity):
+            mach_number = velocity / mach_1
+            if mach_number <= flat:
+                return 1.0
+
+            f = mach_number * inv_step
+            i = int(f)
+            if i >= rows or mach_number < 0.0:
+                return func(mach_number)
+
+            return table[i] + (f - i) * slopes[i]
+
+        return bias
+
+    def factor_array(self, mach_number):
+        """ bias() for an array of Mach numbers """
+
+        if self.grid is None:
+            self.grid = np.array(self.table), np.array(self.slopes)
+
+        table, slopes = self.grid
+        f = mach_number * self.inv_step
+        row = f.astype(int)
+        i = np.clip(row, 0, self.rows - 1)
+        diverge = table[i] + (f - i) * slopes[i]
+
+        outside = (i != row) | (mach_number < 0.0)
+        if outside.any():
+            diverge[outside] = [self.func(m) for m in mach_number[outside]]
+
+        return np.where(mach_number <= self.flat, 1.0, diverge)
+
+
+_noses = {}
+
+
+def for_nose(nose):
+    """ the built in model of a nose type """
+
+    shape = rasp.NOSES[nose]
+    if shape not in _noses:
+        if shape == 2:
+            _noses[shape] = DragModel("round nose", rounded, flat=0.9)
+        else:
+            _noses[shape] = DragModel("sharp nose", sharp, flat=0.9)
+
+    return _noses[shape]
+
+
+def model(rocket):
+    """ the drag model a rocket flies with """
+    return rocket.drag_model or for_nose(rocket.nose)
+
+
+class Curve:
+    """ piecewise linear factor through (mach, factor) points, held flat past either end """
+
+    def __init__(self, points):
+        self.machs = [m for m, _ in points]
+        self.factors = [f for _, f in points]
+
+    def __call__(self, mach_number):
+        machs, factors = self.machs, self.factors
+
+        i = bisect_right(machs, mach_number)
+        if i == 0:
+            return factors[0]
+        if i == len(machs):
+            return factors[-1]
+
+        s = (mach_number - machs[i - 1]) / (machs[i] - machs[i - 1])
+        return factors[i - 1] + s * (factors[i] - factors[i - 1])
+
+
+def read_curve(fname):
+    """ DragModel from a CSV of mach, cd rows, lines that are not numbers are skipped """
+
+    points = []
+    with open(fname, newline='') as fp:
+        for row in csv.reader(fp):
+            try:
+                points.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue
+
+    if not points:
+        raise ValueError("no mach, cd rows in " + fname)
+
+    points.sort()
+    cd_0 = points[0][1]
+    if cd_0 <= 0.0:
+        raise ValueError("cd at mach %g is not positive in %s" % (points[0][0], fname))
+    curve = Curve([(m, cd / cd_0) for m, cd in points])
+
+    return DragModel(os.path.basename(fname), curve, top=max(points[-1][0], MACH_STEP))
+
+
+_curves = {}
+
+
+def load_curve(fname):
+    """ read_curve, read again only when the file changes """
+
+    key = (os.path.realpath(fname), os.stat(fname).st_mtime_ns)
+    if key not in _curves:
+        _curves[key] = read_curve(fname)
+
+    return _curves[key]
@@ -0,0 +1,219 @@
+""" golden
+golden output corpus: every motor in rasp.eng flown in a set of reference
+airframes, to check that a change to the integrator leaves the numbers
+where they were
+
+The airframes are batch decks in test/ (the rocket as of the first
+LAUNCH); every motor in the engine file is flown in the top stage, the
+boosters keep their own motors.  Flights stop at apogee.  Motors that
+cannot lift the stack off the pad are left out.  The corpus is a gzipped
+CSV, one row per flight:
+
+    airframe, motor, max_alt, t_max_alt, max_vel, t_max_vel, t_coff, v_coff, a_coff
+
+in SI units.
+
+    python golden.py              fly the corpus and compare it with test/golden.csv.gz
+    python golden.py -g           fly it and write test/golden.csv.gz
+"""
+
+import io
+import os
+import sys
+import csv
+import copy
+import gzip
+import time
+import argparse
+import contextlib
+
+import nc
+import rasp
+import raspinfo
+
+VERSION = '1.0'
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEST_DIR = os.path.join(HERE, 'test')
+ENG_FILE = os.path.join(HERE, 'rasp.eng')
+CORPUS = os.path.join(TEST_DIR, 'golden.csv.gz')
+
+AIRFRAMES = ('test.ovi', 'golden2.ovi', 'golden3.ovi')
+
+FIELDS = ('max_alt', 't_max_alt', 'max_vel', 't_max_vel', 't_coff', 'v_coff', 'a_coff')
+
+# (absolute, relative) tolerance per field, a value passes when
+# |value - golden| <= absolute + relative * |golden|
+TOLERANCES = {
+    'max_alt': (0.01, 1e-6),
+    't_max_alt': (0.0015, 0.0),   # one and a half time steps
+    'max_vel': (0.001, 1e-6),
+    't_max_vel': (0.0015, 0.0),
+    't_coff': (0.0015, 0.0),
+    'v_coff': (0.001, 1e-6),
+    'a_coff': (0.01, 1e-6),
+}
+
+CHUNK = 20  # motors per job
+
+_rockets = {}
+
+
+def reference(airframe):
+    """ the RocketBat of an airframe deck, engine files made absolute """
+
+    if airframe not in _rockets:
+        deck = os.path.join(TEST_DIR, airframe)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rkt = nc.load_rocket(deck)
+        for stg in rkt.stages:
+            stg.enginefile = os.path.join(os.path.dirname(deck), stg.enginefile)
+        _rockets[airframe] = rkt
+
+    return _rockets[airframe]
+
+
+def flight_for(airframe, motor):
+    """ the flight of motor in the top stage of airframe, None if it cannot leave the pad """
+
+    rkt = copy.deepcopy(reference(airframe))
+    rkt.stages[-1].enginefile = ENG_FILE
+    rkt.stages[-1].motorname = motor
+
+    flight = rkt.as_flight()
+    flight.coast_base = 0.0
+    flight.record = 'summary'
+
+    booster = flight.rocket.stages[0]
+    if flight.e_info[0].npeak() * booster.engnum <= flight.rocket_wt() * rasp.G:
+        return None
+
+    return flight
+
+
+def fly_chunk(job):
+    """ fly a chunk of motors in one airframe, in a worker; a row per flight """
+
+    airframe, motors = job
+
+    rows = []
+    for motor in motors:
+        flight = flight_for(airframe, motor)
+        if flight is None:
+            continue
+        flight.compiled = len(motors) > rasp.JIT_AFTER
+        results = rasp.calc(flight)
+        rows.append([airframe, motor] + [getattr(results, name) for name in FIELDS])
+
+    return rows
+
+
+def fly_corpus(eng_file=ENG_FILE, jobs=1):
+    """ every row of the corpus, in order """
+
+    motors = sorted(raspinfo.load_engine(eng_file))
+    work = [(airframe, motors[i:i + CHUNK]) for airframe in AIRFRAMES for i in range(0, len(motors), CHUNK)]
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunks = list(pool.map(fly_chunk, work))
+    else:
+        chunks = [fly_chunk(job) for job in work]
+
+    return [row for chunk in chunks for row in chunk]
+
+
+def write_corpus(fname, rows):
+    with gzip.open(fname, 'wt', newline='') as fp:
+        out = csv.writer(fp)
+        out.writerow(('airframe', 'motor') + FIELDS)
+        for row in rows:
+            out.writerow(row[:2] + [repr(v) for v in row[2:]])
+
+
+def read_corpus(fname):
+    """ {(airframe, motor): {field: value}} """
+
+    with gzip.open(fname, 'rt', newline='') as fp:
+        return {(row['airframe'], row['motor']): {name: float(row[name]) for name in FIELDS}
+                for row in csv.DictReader(fp)}
+
+
+def compare(rows, golden, tolerances=TOLERANCES):
+    """ (airframe, motor, field, golden, value) for every value out of tolerance, and the flights missing """
+
+    bad = []
+    seen = set()
+    for row in rows:
+        key = tuple(row[:2])
+        seen.add(key)
+        want = golden.get(key)
+        if want is None:
+            bad.append(key + ('new flight', None, None))
+            continue
+        for name, value in zip(FIELDS, row[2:]):
+            absolute, relative = tolerances[name]
+            if abs(value - want[name]) > absolute + relative * abs(want[name]):
+                bad.append(key + (name, want[name], value))
+
+    missing = sorted(set(golden) - seen)
+    return bad, missing
+
+
+def tolerance(spec):
+    """ FIELD=ABS[:REL] """
+
+    name, _, value = spec.partition('=')
+    if name not in TOLERANCES:
+        raise argparse.ArgumentTypeError("no field " + name)
+    absolute, _, relative = value.partition(':')
+    return name, (float(absolute), float(relative) if relative else 0.0)
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='golden', description=f'RASP golden output corpus (v{VERSION})')
+    parser.add_argument('-g', '--generate', action='store_true', help="write the corpus instead of checking it")
+    parser.add_argument('-c', '--corpus', default=CORPUS, help="corpus file")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="fly in N processes")
+    parser.add_argument('-t', '--tol', type=tolerance, action='append', default=[],
+                        help="tolerance of a field, FIELD=ABS[:REL]")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    t0 = time.perf_counter()
+    rows = fly_corpus(ENG_FILE, args.jobs)
+    elapsed = time.perf_counter() - t0
+
+    if args.generate:
+        write_corpus(args.corpus, rows)
+        print("%c %d flights written to %s in %.1f sec" % (rasp.CH1, len(rows), args.corpus, elapsed))
+        return 0
+
+    tolerances = dict(TOLERANCES, **dict(args.tol))
+    bad, missing = compare(rows, read_corpus(args.corpus), tolerances)
+
+    for airframe, motor, name, want, got in bad:
+        if want is None:
+            print("  %-12s %-12s %s" % (airframe, motor, name))
+        else:
+            print("  %-12s %-12s %-10s golden %.10g  now %.10g" % (airframe, motor, name, want, got))
+    for airframe, motor in missing:
+        print("  %-12s %-12s no longer flies" % (airframe, motor))
+
+    print("%c %d flights in %.1f sec, %d values out of tolerance, %d flights missing" % (
+          rasp.CH1, len(rows), elapsed, len(bad), len(missing)))
+
+    return 1 if bad or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+""" instrument
+per-phase wall time and call counts, to find where a slow deck spends its
+time
+
+Profiling is off until start() is called (rasp.py and nc.py do that for
+--profile).  While it is off phase() hands back one shared do-nothing
+context and the integrators take their usual path, so the hooks cost a
+function call per phase entered, nothing per time step.
+
+Phases are timed exclusively: time spent in a phase entered from inside
+another one is taken off the outer one, so the phases of a LAUNCH add up
+to no more than its wall time, the rest being reported as 'other'.
+
+    engine_load    motor lookups (raspinfo.find_motor)
+    flight_setup   deck to Flight, atmosphere table and aero profiles
+    powered        Euler steps up to the last burnout, and the stages' coasts between burns
+    coast          Euler steps after the last burnout
+    flight         flights not split by phase: RK45 and the compiled kernel
+    output         report header, Results.display, ejection and convergence tables, file writes
+
+The report is JSON:
+
+    {"version": ..., "seconds": ..., "phases": {name: {"seconds", "calls"[, "steps"]}},
+     "launches": [{"launch", "name", "motor", "seconds", "other", "phases": {...}}]}
+
+where calls counts the times a phase was entered and steps the time steps
+taken in it.
+"""
+
+import sys
+import json
+import time
+import contextlib
+
+VERSION = '1.0'
+
+_NULL = contextlib.nullcontext()
+
+profile = None  # the Profile being recorded, None when profiling is off
+
+
+class Profile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.launches = []
+        self.launch = None  # the record of the LAUNCH being flown
+        self._stack = []    # [name, start, time in nested phases]
+
+    def enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def leave(self, steps=0):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+        self._add(self.phases, name, elapsed - nested, steps)
+        if self.launch is not None:
+            self._add(self.launch['phases'], name, elapsed - nested, steps)
+
+    @staticmethod
+    def _add(phases, name, seconds, steps):
+        rec = phases.get(name)
+        if rec is None:
+            rec = phases[name] = dict(seconds=0.0, calls=0)
+        rec['seconds'] += seconds
+        rec['calls'] += 1
+        if steps:
+            rec['steps'] = rec.get('steps', 0) + steps
+
+    def report(self):
+        return dict(version=VERSION, seconds=time.perf_counter() - self.start,
+                    phases=self.phases, launches=self.launches)
+
+
+class Phase:
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.prof.enter(self.name)
+
+    def __exit__(self, *exc):
+        self.prof.leave()
+
+
+def start():
+    """ turn profiling on, dropping anything recorded so far """
+    global profile
+    profile = Profile()
+
+
+def stop():
+    """ turn profiling off, returns the report """
+    global profile
+    report, profile = profile.report(), None
+    return report
+
+
+def active():
+    return profile is not None
+
+
+def phase(name):
+    """ a context that times one entry into phase name """
+    return _NULL if profile is None else Phase(profile, name)
+
+
+@contextlib.contextmanager
+def launch(name):
+    """
+    a context for one LAUNCH, yields its record (None when profiling is
+    off) for the caller to fill in the motor
+    """
+
+    if profile is None:
+        yield None
+        return
+
+    rec = dict(launch=len(profile.launches) + 1, name=name, motor=None, seconds=0.0, other=0.0, phases={})
+    outer, profile.launch = profile.launch, rec
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        profile.launch = outer
+        rec['seconds'] = time.perf_counter() - t0
+        rec['other'] = max(0.0, rec['seconds'] - sum(p['seconds'] for p in rec['phases'].values()))
+        profile.launches.append(rec)
+
+
+def add_launch(rec):
+    """ the record of a LAUNCH flown in a worker process into the report and the totals """
+
+    if profile is None or rec is None:
+        return
+
+    rec['launch'] = len(profile.launches) + 1
+    profile.launches.append(rec)
+    for name, p in rec['phases'].items():
+        total = profile.phases.setdefault(name, dict(seconds=0.0, calls=0))
+        for key, value in p.items():
+            total[key] = total.get(key, 0) + value
+
+
+def flight_phases(stream, results):
+    """
+    the samples of an Euler stream, timed as flight_setup up to the t=0
+    sample, powered until results has the last stage burnout and coast after
+    """
+
+    prof = profile
+    prof.enter('flight_setup')
+    try:
+        first = next(stream)
+    finally:
+        prof.leave()
+
+    prof.enter('powered')
+    powered, steps = True, 0
+    try:
+        yield first
+        for sample in stream:
+            yield sample
+            steps += 1
+            if powered and results.t_coff:
+                prof.leave(steps)
+                prof.enter('coast')
+                powered, steps = False, 0
+    finally:
+        prof.leave(steps)
+
+
+def write_report(fname, report=None):
+    """ the report as JSON to fname, '-' for stderr """
+
+    if report is None:
+        report = profile.report()
+
+    if fname == '-':
+        json.dump(report, sys.stderr, indent=2)
+        print(file=sys.stderr)
+    else:
+        with open(fname, 'w') as fp:
+            json.dump(report, fp, indent=2)
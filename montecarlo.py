@@ -0,0 +1,339 @@
+""" montecarlo
+Monte Carlo dispersion of a RASP rocket
+
+Flies the rocket of a batch deck (as of its first LAUNCH) N times, each
+time with Cd, dry mass, site temperature, barometric pressure and the total
+impulse of every motor perturbed, and reports the spread of the results.
+
+The perturbations are drawn in this process from one seeded generator, in
+flight order, and the results are folded into the statistics in flight
+order, so a seed always gives the same report whatever the number of jobs.
+Flights are handed out in chunks with only a few chunks in flight at a
+time and the statistics are online (Welford mean and variance, P^2
+quantiles, a fixed bin histogram), so memory does not grow with N.
+"""
+
+import sys
+import copy
+import math
+import random
+import argparse
+from collections import deque, namedtuple
+
+import nc
+import rasp
+import raspvec
+
+VERSION = '1.0'
+
+CHUNK = 250                               # flights per job
+QUANTILES = (0.05, 0.25, 0.50, 0.75, 0.95)
+BIN_FT = 25.0                             # apogee histogram bin width (ft)
+HIST_WIDTH = 50                           # characters in the longest histogram bar
+
+# the perturbations of one flight, impulse holds a factor per stage
+Draw = namedtuple('Draw', 'cd mass temp press impulse')
+
+# what is kept of each flight and its label in the report
+FIELDS = (
+    ('max_alt', "Apogee (ft)", rasp.M2FT),
+    ('t_max_alt', "Time to apogee (s)", 1.0),
+    ('max_vel', "Max velocity (ft/s)", rasp.M2FT),
+    ('v_rod', "Rod velocity (ft/s)", rasp.M2FT),
+)
+
+
+class Dist:
+    """
+    a perturbation, from a spec 'normal:WIDTH' (WIDTH is one sigma),
+    'uniform:WIDTH' (+/- WIDTH) or 'none'
+    """
+
+    def __init__(self, spec="none"):
+        kind, _, width = spec.partition(':')
+        self.kind = kind.lower()
+        self.width = float(width) if width else 0.0
+
+        if self.kind not in ('none', 'normal', 'uniform'):
+            raise ValueError("unknown distribution: " + spec)
+
+    def __str__(self):
+        return "none" if self.kind == 'none' else "%s:%g" % (self.kind, self.width)
+
+    def draw(self, rng):
+        if self.kind == 'normal':
+            return rng.gauss(0.0, self.width)
+        elif self.kind == 'uniform':
+            return rng.uniform(-self.width, self.width)
+        return 0.0
+
+
+class Welford:
+    """ running count, mean, variance, min and max """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class P2Quantile:
+    """ the P^2 estimate of quantile p (Jain and Chlamtac), five markers whatever the count """
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []                                        # marker heights
+        self.n = [0, 1, 2, 3, 4]                           # marker positions
+        self.want = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]    # desired positions
+        self.step = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x):
+        q, n = self.q, self.n
+
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.want[i] += self.step[i]
+
+        # nudge the middle markers back toward where they should be
+        for i in (1, 2, 3):
+            d = self.want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if len(self.q) < 5:
+            if not self.q:
+                return math.nan
+            return self.q[min(len(self.q) - 1, int(self.p * len(self.q)))]
+        return self.q[2]
+
+
+class Stats:
+    """ the online statistics of one result """
+
+    def __init__(self, bin_width=None):
+        self.moments = Welford()
+        self.quantiles = [P2Quantile(p) for p in QUANTILES]
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def add(self, x):
+        self.moments.add(x)
+        for quantile in self.quantiles:
+            quantile.add(x)
+        if self.bin_width:
+            b = math.floor(x / self.bin_width)
+            self.bins[b] = self.bins.get(b, 0) + 1
+
+
+def draws(rng, count, num_stages, cd, mass, temp, press, impulse):
+    """ the perturbations of count flights, lazily and in order """
+
+    for _ in range(count):
+        yield Draw(1.0 + cd.draw(rng), 1.0 + mass.draw(rng), temp.draw(rng) * 5 / 9,
+                   1.0 + press.draw(rng), tuple(1.0 + impulse.draw(rng) for _ in range(num_stages)))
+
+
+def perturb(flight, draw):
+    """ a copy of flight with the draw applied """
+
+    f = copy.copy(flight)
+    f.rocket = copy.deepcopy(flight.rocket)
+    f.e_info = [engine.scaled(k) for engine, k in zip(flight.e_info, draw.impulse)]
+    f.base_temp = flight.base_temp + draw.temp
+    f.baro_press = flight.baro_press * draw.press
+
+    for stage in f.rocket.stages:
+        stage.cd *= draw.cd
+        stage.weight *= draw.mass
+
+    return f
+
+
+def fly_chunk(job):
+    """ fly a chunk of perturbed flights, in a worker; returns a tuple of FIELDS per flight """
+
+    flight, chunk, vector = job
+    flights = [perturb(flight, draw) for draw in chunk]
+
+    if vector and len(flights) >= raspvec.BATCH_MIN:
+        summaries = raspvec.calc_batch(flights)
+    else:
+        summaries = [rasp.calc(f) for f in flights]
+
+    return [(s.max_alt, s.t_max_alt, s.max_vel, s.vrod()) for s in summaries]
+
+
+def chunks(it, size):
+    chunk = []
+    for item in it:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(flight, count, seed=0, cd=Dist(), mass=Dist(), temp=Dist(), press=Dist(), impulse=Dist(),
+        jobs=1, chunk=CHUNK, vector=False, bin_width=BIN_FT / rasp.M2FT, progress=None):
+    """
+    fly count perturbed copies of flight, returns a Stats per FIELDS entry.
+    progress, if given, is called with the stats after every chunk.
+    """
+
+    flight = copy.copy(flight)
+    flight.record = 'summary'
+    flight.compiled = count > rasp.JIT_AFTER
+
+    stats = [Stats(bin_width if name == 'max_alt' else None) for name, _, _ in FIELDS]
+    rng = random.Random(seed)
+    work = ((flight, c, vector) for c in chunks(draws(rng, count, len(flight.rocket.stages),
+                                                      cd, mass, temp, press, impulse), chunk))
+
+    def fold(rows):
+        for row in rows:
+            for st, x in zip(stats, row):
+                st.add(x)
+        if progress:
+            progress(stats)
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # keep a couple of chunks per worker queued, results are taken in order
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = deque()
+            for job in work:
+                pending.append(pool.submit(fly_chunk, job))
+                if len(pending) >= 2 * jobs:
+                    fold(pending.popleft().result())
+            while pending:
+                fold(pending.popleft().result())
+    else:
+        for job in work:
+            fold(fly_chunk(job))
+
+    return stats
+
+
+def print_stats(fp, stats):
+    print("%c %-20s %9s %9s %9s %9s" % (rasp.CH1, "", "Mean", "Std", "Min", "Max") +
+          "".join(" %8s" % ("P%d" % round(p * 100)) for p in QUANTILES), file=fp)
+
+    for (_, label, scale), st in zip(FIELDS, stats):
+        m = st.moments
+        print("%c %-20s %9.2f %9.2f %9.2f %9.2f" % (
+              rasp.CH1, label, m.mean * scale, m.std() * scale, m.min * scale, m.max * scale) +
+              "".join(" %8.2f" % (q.value() * scale) for q in st.quantiles), file=fp)
+
+
+def print_histogram(fp, st, scale=rasp.M2FT):
+    if not st.bins:
+        return
+
+    lo, hi = min(st.bins), max(st.bins)
+    most = max(st.bins.values())
+
+    print(rasp.CH1, file=fp)
+    for b in range(lo, hi + 1):
+        count = st.bins.get(b, 0)
+        print("%c %9.1f %7d  %s" % (rasp.CH1, b * st.bin_width * scale, count,
+                                    '*' * math.ceil(HIST_WIDTH * count / most)), file=fp)
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='montecarlo', description=f'RASP Monte Carlo dispersion (v{VERSION})',
+                                     epilog="distributions are normal:SIGMA, uniform:HALFWIDTH or none; "
+                                            "all are fractions of the value except --temp, in degF")
+    parser.add_argument('-n', '--count', type=int, default=1000, help="number of flights")
+    parser.add_argument('-s', '--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--cd', type=Dist, default=Dist(), help="Cd of every stage")
+    parser.add_argument('--mass', type=Dist, default=Dist(), help="dry mass of every stage")
+    parser.add_argument('--temp', type=Dist, default=Dist(), help="site temperature (degF)")
+    parser.add_argument('--press', type=Dist, default=Dist(), help="barometric pressure")
+    parser.add_argument('--impulse', type=Dist, default=Dist(), help="total impulse, drawn per motor")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="fly in N processes")
+    parser.add_argument('-c', '--chunk', type=int, default=CHUNK, help="flights per job")
+    parser.add_argument('-v', '--vector', action='store_true', help=f"fly chunks of {raspvec.BATCH_MIN} or more flights as a numpy batch")
+    parser.add_argument('-b', '--bin', type=float, default=BIN_FT, help="apogee histogram bin (ft)")
+    parser.add_argument('-p', '--progress', action='store_true', help="report the apogee after every chunk")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+    parser.add_argument('raspfile', help="rasp batch file with the rocket")
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    rkt = nc.load_rocket(args.raspfile)
+    if rkt is None:
+        print("no rocket in", args.raspfile)
+        return
+
+    if args.vector and raspvec.np is None:
+        print("--vector needs numpy, flying one at a time")
+        args.vector = False
+
+    flight = rkt.as_flight()
+
+    def progress(stats):
+        m, q = stats[0].moments, stats[0].quantiles
+        print("%c %7d flights  apogee mean %8.1f  P5 %8.1f  P50 %8.1f  P95 %8.1f ft" % (
+              rasp.CH1, m.count, m.mean * rasp.M2FT, q[0].value() * rasp.M2FT,
+              q[2].value() * rasp.M2FT, q[4].value() * rasp.M2FT))
+
+    stats = run(flight, args.count, args.seed, args.cd, args.mass, args.temp, args.press, args.impulse,
+                args.jobs, args.chunk, args.vector, args.bin / rasp.M2FT, progress if args.progress else None)
+
+    print("%c %s  %s  %d flights  seed %d" % (
+          rasp.CH1, rkt.title, '/'.join(e.code for e in flight.e_info), args.count, args.seed))
+    print("%c cd %s  mass %s  temp %s  press %s  impulse %s" % (
+          rasp.CH1, args.cd, args.mass, args.temp, args.press, args.impulse))
+    print(rasp.CH1)
+    print_stats(sys.stdout, stats)
+    print_histogram(sys.stdout, stats[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+""" motorsel
+pick motors for a rocket: fly every motor in the engine file that fits it
+and rank them against an apogee window
+
+The rocket is the one a batch deck has built by its first LAUNCH.  Motors
+are weeded out from the engine file index alone, before anything is
+parsed or flown: diameter and length, whether the peak thrust lifts the
+rocket, a drag free upper bound on the launch rod velocity and, for
+single stage rockets, a drag free upper bound on apogee from the total
+impulse.
+
+The motors left are flown in a process pool and ranked by how close their
+apogee comes to the window.
+"""
+
+import sys
+import copy
+import math
+import argparse
+from collections import namedtuple
+
+import nc
+import rasp
+import raspinfo
+
+VERSION = '1.0'
+
+# one row of the ranking
+Candidate = namedtuple('Candidate', 'code mfg diam dlen ntot v_rod max_vel max_alt t_max_alt')
+
+
+def apogee_bound(impulse, burn_time, dry_mass):
+    """
+    highest apogee the impulse could give a rocket that never weighs less
+    than dry_mass, with no drag: v <= impulse / dry_mass throughout, for at
+    most the burn time plus the coast to a stop
+    """
+
+    v_max = impulse / dry_mass
+    return v_max * burn_time + v_max * v_max / (2 * rasp.G)
+
+
+def rod_bound(peak_thrust, dry_mass, rod):
+    """
+    fastest the rocket could leave the rod: peak thrust on the lightest
+    mass, no drag.  Zero when even that cannot lift it; the launch mass is
+    no bound as the rocket gets lighter while it burns.
+    """
+
+    accel = peak_thrust / dry_mass - rasp.G
+    if accel <= 0.0:
+        return 0.0
+
+    return math.sqrt(2 * accel * rod)
+
+
+def prune(rkt, num, eng_file, diam=None, max_len=None, min_rod_vel=0.0, apogee_low=None):
+    """
+    motor codes from eng_file that may suit stage num of rkt, and a
+    {reason: count} of the ones dropped.  A diam or max_len of 0 or None
+    is no limit.
+    """
+
+    dropped = {}
+
+    def drop(reason):
+        dropped[reason] = dropped.get(reason, 0) + 1
+
+    index = raspinfo.load_index(eng_file)
+    if not index:
+        return [], dropped
+
+    # the rocket less the motors of stage num, flown once with any motor there
+    trial = copy.deepcopy(rkt)
+    trial.stages[num].enginefile = eng_file
+    trial.stages[num].motorname = next(iter(index))
+    flight = trial.as_flight()
+    stage = flight.rocket.stages[num]
+    others = flight.rocket_wt() - flight.e_info[num].wt * stage.engnum
+    single = len(flight.rocket.stages) == 1
+
+    keep = []
+    for code, entry in sorted(index.items()):
+        if diam and entry.diam != diam:
+            drop("diameter")
+            continue
+        if max_len and entry.dlen > max_len:
+            drop("length")
+            continue
+
+        dry_mass = others + (entry.wt - entry.m2) * stage.engnum
+
+        # the bounds hold while this stage is the one burning
+        if num == 0:
+            v_rod = rod_bound(entry.npeak * stage.engnum, dry_mass, flight.rod)
+            if v_rod <= 0.0:
+                drop("no liftoff")
+                continue
+            if v_rod < min_rod_vel:
+                drop("rod velocity")
+                continue
+
+        if apogee_low is not None and single:
+            if apogee_bound(entry.ntot * stage.engnum, entry.t2, dry_mass) < apogee_low:
+                drop("impulse")
+                continue
+
+        keep.append(code)
+
+    return keep, dropped
+
+
+def fly_motor(job):
+    """ fly one candidate motor, in a worker """
+
+    rkt, num, code, compiled = job
+
+    rkt = copy.deepcopy(rkt)
+    rkt.stages[num].motorname = code
+    flight = rkt.as_flight()
+    flight.record = 'summary'
+    flight.compiled = compiled
+    results = rasp.calc(flight)
+
+    engine = flight.e_info[num]
+    return Candidate(engine.code, engine.mfg, engine.diam, engine.dlen, engine.ntot(),
+                     results.vrod(), results.max_vel, results.max_alt, results.t_max_alt)
+
+
+def rank(candidates, min_rod_vel=0.0, apogee_low=None, apogee_high=None):
+    """ candidates in order of preference, each with its miss from the window """
+
+    def miss(c):
+        if apogee_low is not None and c.max_alt < apogee_low:
+            return apogee_low - c.max_alt
+        if apogee_high is not None and c.max_alt > apogee_high:
+            return c.max_alt - apogee_high
+        return 0.0
+
+    def centre(c):
+        if apogee_low is None or apogee_high is None:
+            return -c.max_alt
+        return abs(c.max_alt - (apogee_low + apogee_high) / 2)
+
+    ok = [c for c in candidates if c.v_rod >= min_rod_vel]
+    return sorted(((c, miss(c)) for c in ok), key=lambda cm: (cm[1], centre(cm[0])))
+
+
+def select(rkt, num, eng_file, diam=None, max_len=None, min_rod_vel=0.0,
+           apogee_low=None, apogee_high=None, jobs=1):
+    """ prune, fly and rank, returns the ranking and the pruning counts """
+
+    codes, dropped = prune(rkt, num, eng_file, diam, max_len, min_rod_vel, apogee_low)
+    work = [(rkt, num, code, len(codes) > rasp.JIT_AFTER) for code in codes]
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            candidates = list(pool.map(fly_motor, work))
+    else:
+        candidates = [fly_motor(job) for job in work]
+
+    slow = sum(1 for c in candidates if c.v_rod < min_rod_vel)
+    if slow:
+        dropped["rod velocity (flown)"] = slow
+
+    return rank(candidates, min_rod_vel, apogee_low, apogee_high), dropped
+
+
+def print_ranking(fp, ranking, top=None):
+    print("%c %4s  %-12s %-5s %4s %5s %9s %9s %9s %9s %7s %8s" % (
+          rasp.CH1, "Rank", "Motor", "Mfg", "Dia", "Len", "Impulse", "Rod Vel", "Max Vel", "Apogee",
+          "Time", "Miss"), file=fp)
+    print("%c %4s  %-12s %-5s %4s %5s %9s %9s %9s %9s %7s %8s" % (
+          rasp.CH1, "", "", "", "(mm)", "(mm)", "(N-sec)", "(ft/sec)", "(ft/sec)", "(feet)",
+          "(sec)", "(feet)"), file=fp)
+
+    for num, (c, miss) in enumerate(ranking[:top], start=1):
+        print("  %4d  %-12s %-5s %4d %5d %9.1f %9.1f %9.1f %9.1f %7.2f %8.1f" % (
+              num, c.code, c.mfg, c.diam, c.dlen, c.ntot, c.v_rod * rasp.M2FT, c.max_vel * rasp.M2FT,
+              c.max_alt * rasp.M2FT, c.t_max_alt, miss * rasp.M2FT), file=fp)
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='motorsel', description=f'Rank motors for a RASP rocket (v{VERSION})')
+    parser.add_argument('-s', '--stage', type=int, default=1, help="stage to find a motor for")
+    parser.add_argument('-d', '--diam', type=int, help="motor diameter (mm), default the deck motor's, 0 for any")
+    parser.add_argument('-l', '--max-len', type=int, help="longest motor (mm)")
+    parser.add_argument('-r', '--min-rod-vel', type=float, default=0.0, help="slowest rod exit (ft/sec)")
+    parser.add_argument('-a', '--apogee', type=float, nargs=2, metavar=('LOW', 'HIGH'), help="apogee window (ft)")
+    parser.add_argument('-n', '--top', type=int, help="show only the best N")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="fly motors in N processes")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+    parser.add_argument('raspfile', help="rasp batch file with the rocket")
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    rkt = nc.load_rocket(args.raspfile)
+    if rkt is None:
+        print("no rocket in", args.raspfile)
+        return
+
+    num = args.stage - 1
+    if not 0 <= num < len(rkt.stages):
+        print("no stage", args.stage)
+        return
+
+    stg = rkt.stages[num]
+    diam = args.diam
+    if diam is None and stg.motorname:
+        diam = raspinfo.find_motor(stg.enginefile, stg.motorname).diam
+
+    low, high = (v / rasp.M2FT for v in args.apogee) if args.apogee else (None, None)
+
+    ranking, dropped = select(rkt, num, stg.enginefile, diam, args.max_len, args.min_rod_vel / rasp.M2FT,
+                              low, high, args.jobs)
+
+    print("%c %s  stage %d  diameter %s mm  ( %d flown, dropped: %s )" % (
+          rasp.CH1, rkt.title, args.stage, diam or "any",
+          len(ranking) + dropped.get("rod velocity (flown)", 0),
+          ", ".join("%d %s" % (n, why) for why, n in dropped.items()) or "none"))
+    print_ranking(sys.stdout, ranking, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,22 @@
+import io
 import os
 import re
+import csv
 import sys
+import copy
+import math
+import time
+import argparse
+import contextlib
+import itertools
 import units
+from collections import namedtuple
 import raspinfo
+import atmos
+import diverge
+import instrument
 import rasp
+import rasptrace
 
 VERSION = '4.2'
 
@@ -43,6 +56,8 @@ MNEMONICS = {
       "verbose": (None, "VERBOSE", "INTEGER", None),
       "detail": (None, "VERBOSE", "INTEGER", None),
       "launch": (None, "LAUNCH", None, None),
+      "sweep": (None, "SWEEP", None, None),
+      "solve": (None, "SOLVE", None, None),
       "quit": (None, "QUIT", None, None),
       "done": (None, "QUIT", None, None),
       "exit": (None, "QUIT", None, None),
@@ -50,13 +65,22 @@ MNEMONICS = {
       "dump": (None, "DUMP", None, None),
       "title": (None, "TITLE", None, None),
 
-      "dtime": ("sec", "DTIME", "DOUBLE", "TIME"),
+      "dtime": ("sec", "DTIME", "DOUBLE", "time"),
       "printtime": ("sec", "PRINTTIME", "DOUBLE", "time"),
       "printcommand": (None, "PRINTCMD", "STRING", None),
+      "converge": (None, "CONVERGE", "INTEGER", None),
+      "convergence": (None, "CONVERGE", "INTEGER", None),
+      "ejection": (None, "EJECTION", "INTEGER", None),
+      "delays": (None, "EJECTION", "INTEGER", None),
+      "trace": (None, "TRACE", "STRING", None),
+      "integrator": (None, "INTEGRATOR", "STRING", None),
+      "method": (None, "INTEGRATOR", "STRING", None),
+      "record": (None, "RECORD", "STRING", None),
 
       "sitealtitude": ("ft", "SITEALT", "DOUBLE", "length"),
       "sitealt": ("ft", "SITEALT", "DOUBLE", "length"),
       "finalaltitude": ("ft", "FINALALT", "DOUBLE", "length"),
+      "finalalt": ("ft", "FINALALT", "DOUBLE", "length"),
       "coasttime": ("sec", "COASTTIME", "DOUBLE", "time"),
       "sitetemperature": ("F", "SITETEMP", "DOUBLE", "temp"),
       "sitetemp": ("F", "SITETEMP", "DOUBLE", "temp"),
@@ -68,6 +92,8 @@ MNEMONICS = {
 
       "numstages": (None, "NUMSTAGES", "INTEGER", None),
       "nosetype": (None, "NOSETYPE", "STRING", None),
+      "dragcurve": (None, "DRAGCURVE", "FILENAME", "EXISTS"),
+      "cdfile": (None, "DRAGCURVE", "FILENAME", "EXISTS"),
       "stage": (None, "STAGE", "INTEGER", None),
       "stagedelay": ("sec", "STAGEDELAY", "DOUBLE", "time"),
       "diameter": ("in", "DIAMETER", "DOUBLE", "length"),
@@ -93,6 +119,29 @@ MNEMONICS = {
       "launchangle": ("deg", "THETA", "DOUBLE", "angle"),
 }
 
+# settings that make no sense to SWEEP
+NO_SWEEP = ("HOME", "UNITS", "MODE", "QUIET", "VERBOSE", "DEBUG", "PRINTCMD", "CONVERGE", "EJECTION",
+            "NUMSTAGES", "STAGE", "DESTINATION", "OUTFILE", "PRINTTIME", "RECORD", "TRACE")
+
+# TRACE settings: the rasptrace column type, none for no trace file
+TRACE_TYPES = {"none": None, "double": 'd', "float": 'f'}
+
+# one SWEEP axis, values are (label, parse_value()) pairs
+Sweep = namedtuple('Sweep', 'heading stage cmd name values')
+
+# settings SOLVE can adjust: the Stage attribute and the default bracket (SI)
+SOLVABLE = {
+    "DRYMASS": ("weight", 0.0, 5.0),
+    "CD": ("cd", 0.0, 2.0),
+    "STAGEDELAY": ("stage_delay", 0.0, 10.0),
+}
+
+SOLVE_FTOL = 0.01  # meters of apogee
+SOLVE_ITER = 60
+
+SWEEP_COLUMNS = ("motor", "max_alt (m)", "t_max_alt (s)", "v_rod (m/s)",
+                 "max_vel (m/s)", "t_max_vel (s)", "v_coff (m/s)", "t_coff (s)")
+
 
 class Dbl:
     def __init__(self, inp, unit):
@@ -132,9 +181,15 @@ class RocketBat:
         
         # self.home = eng_home    # v4.1
 
-        self.dtime = Dbl("0.01", "sec")
+        self.dtime = Dbl("0.001", "sec")
         self.printtime = Dbl("0.1", "sec")
+        self.converge = 0
+        self.ejection = 0
+        self.trace = "none"    # binary trace file next to the report, see rasptrace
         self.printcmd = "lp -dL1"
+        self.integrator = "euler"
+        self.record = "full"
+        self.compiled = False  # summaries flown by raspjit, set by batch_flite for decks of many LAUNCHes
         self.sitealt = Dbl("0.00", "ft")
         
         # AddBatDbl (& BatStru->sitetemp, "59.0", "F", 288.15)
@@ -151,10 +206,13 @@ class RocketBat:
         self.outfile = ""
         self.theta = Dbl("0.00", "deg")
         self.nosetype = "ogive"
+        self.dragcurve = ""  # CSV of mach, cd; empty for the nose type's curve
 
         self.stages = []
         self.set_stages(1)
 
+        self.sweeps = []
+
     def set_stages(self, num):
         while len(self.stages) < num:
             self.stages.append(StageBat())
@@ -167,7 +225,12 @@ class RocketBat:
         print("BatStru->home        = %s" % "NONE")  # self.home)
         print("BatStru->dtime,      = %s" % str(self.dtime))
         print("BatStru->printtime   = %s" % str(self.printtime))
+        print("BatStru->converge    = %d" % self.converge)
+        print("BatStru->ejection    = %d" % self.ejection)
+        print("BatStru->trace       = %s" % self.trace)
         print("BatStru->printcmd    = %s" % self.printcmd)
+        print("BatStru->integrator  = %s" % self.integrator)
+        print("BatStru->record      = %s" % self.record)
         print()
         print("BatStru->sitealt     = %s" % str(self.sitealt))
         print("BatStru->sitetemp    = %s" % str(self.sitetemp))
@@ -179,7 +242,9 @@ class RocketBat:
         print("BatStru->destination = %s" % self.destination)
         print("BatStru->outfile     = %s" % self.outfile)
         print("BatStru->nosetype    = %s" % self.nosetype)
+        print("BatStru->dragcurve   = %s" % self.dragcurve)
         print("BatStru->numstages   = %d" % len(self.stages))
+        print("BatStru->sweeps      = %s" % ", ".join(sw.heading for sw in self.sweeps))
 
         for j, stage in enumerate(self.stages):
             print()
@@ -202,6 +267,13 @@ class RocketBat:
         print("TITLE               ", self.title)
         print("%-20s" % ["SUMMARY", "VERBOSE", "DEBUG"][self.mode])
         print("UNITS               ", self.units)
+        print("DTIME               ", self.dtime)
+        print("PRINTTIME           ", self.printtime)
+        print("CONVERGE            ", self.converge)
+        print("EJECTION            ", self.ejection)
+        print("TRACE               ", self.trace)
+        print("INTEGRATOR          ", self.integrator)
+        print("RECORD              ", self.record)
         print("OUTFILE             ", self.outfile)
         print()
         print("SITETEMP            ", self.sitetemp)
@@ -209,6 +281,8 @@ class RocketBat:
         print("RAILLENGTH          ", self.raillength)
         print()
         print("NOSETYPE            ", self.nosetype)
+        if self.dragcurve:
+            print("DRAGCURVE           ", self.dragcurve)
         print("DESTINATION         ", self.destination)
         print("THETA               ", self.theta)
         print("FINALALT            ", self.finalalt)
@@ -234,6 +308,10 @@ class RocketBat:
     def as_flight(self):
         """ convert RocketBat to Flight """
 
+        with instrument.phase('flight_setup'):
+            return self._as_flight()
+
+    def _as_flight(self):
         flight = rasp.Flight()
 
         flight.rname = self.title
@@ -243,15 +321,30 @@ class RocketBat:
         flight.coast_base = self.coasttime
         flight.base_temp = self.sitetemp
         flight.rod = self.raillength
+        flight.method = self.integrator
+        flight.dt = float(self.dtime)
+        flight.print_t = float(self.printtime)
+        flight.compiled = self.compiled
+
+        # a trace file and the ejection table take every step, whatever RECORD says;
+        # without them or the verbose table nothing reads the trace
+        if TRACE_TYPES[self.trace] or self.ejection:
+            flight.record = 'full'
+        elif flight.verbose:
+            flight.record = self.record
+        else:
+            flight.record = 'summary'
 
         if self.sitepress:
             flight.baro_press = self.sitepress / rasp.IN2PASCAL
         else:
-            flight.baro_press = rasp.standard_press(self.sitealt)
+            flight.baro_press = atmos.standard_press(self.sitealt)
 
         rocket = flight.rocket = rasp.Rocket()
 
         rocket.nose = rasp.find_nose(self.nosetype)
+        if self.dragcurve:
+            rocket.drag_model = diverge.load_curve(self.dragcurve)
 
         for i, stg in enumerate(self.stages):
             flight.e_info.append(raspinfo.find_motor(stg.enginefile, stg.motorname))
@@ -263,20 +356,21 @@ class RocketBat:
             stage.weight = stg.drymass
             stage.maxd = stg.diameter / rasp.IN2M
             stage.cd = stg.cd
+            stage.stage_delay = float(stg.stagedelay)
 
             stage.fins = rasp.Fins()
             stage.fins.num = stg.numfins
             stage.fins.thickness = stg.finthickness / rasp.IN2M
             stage.fins.span = stg.finspan / rasp.IN2M
 
-        return flight
-
+        # the ejection table needs the trace past the last charge, COASTTIME 0 stops it at apogee
+        if self.ejection:
+            flight.coast_base = max(flight.coast_base, rasp.ejection_coast(flight))
 
-def to_da_moon_alice(rkt):
-    flight = rkt.as_flight()
+        return flight
 
-    print("Launching ( %s ) ..." % flight.e_info[0].code)
 
+def out_name(rkt):
     fname = None
     if rkt.destination == "printer":
         fname = PRINTER
@@ -290,13 +384,414 @@ def to_da_moon_alice(rkt):
 
     if not fname.endswith('.txt'):
         fname += '.txt'
-    with open(fname, "w") as fp:
+
+    return fname
+
+
+def trace_name(rkt):
+    return os.path.splitext(out_name(rkt))[0] + rasptrace.EXT
+
+
+def fly(rkt, fp, flight=None):
+    """ fly rkt and write its report to fp, returns the flight """
+
+    if flight is None:
+        flight = rkt.as_flight()
+
+    with instrument.phase('output'):
         flight.dump_header(fp)
-        results = rasp.calc(flight)
+    results = rasp.calc(flight)
+    with instrument.phase('output'):
         results.display(fp, flight.verbose)
+        if rkt.ejection:
+            rasp.print_ejection(fp, flight, results)
+        if rkt.converge:
+            rasp.print_convergence(fp, flight, results)
+        if TRACE_TYPES[rkt.trace]:
+            rasptrace.write(trace_name(rkt), flight, results, TRACE_TYPES[rkt.trace])
+
+    return flight
+
+
+def to_da_moon_alice(rkt):
+    with instrument.launch(out_name(rkt)) as rec:
+        flight = rkt.as_flight()
+        if rec is not None:
+            rec['motor'] = flight.e_info[0].code
+
+        print("Launching ( %s ) ..." % flight.e_info[0].code)
+
+        with instrument.phase('output'), open(out_name(rkt), "w") as fp:
+            fly(rkt, fp, flight)
+
+
+def launch_job(rkt):
+    """
+    a LAUNCH run in a worker, returns the output file name, motor, report,
+    wall time and profile record (None unless profiling)
+    """
+
+    start = time.perf_counter()
+    with instrument.launch(out_name(rkt)) as rec:
+        fp = io.StringIO()
+        flight = fly(rkt, fp)
+        if rec is not None:
+            rec['motor'] = flight.e_info[0].code
+
+    return out_name(rkt), flight.e_info[0].code, fp.getvalue(), time.perf_counter() - start, rec
+
+
+def load_rocket(batch_file):
+    """ the RocketBat as it stands at the deck's first LAUNCH, None if it has none """
+
+    launches = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch_flite(batch_file, launch=lambda rkt: launches.append(copy.deepcopy(rkt)))
+
+    return launches[0] if launches else None
+
+
+def batch_parallel(batch_files, jobs):
+    """
+    Run every LAUNCH of every batch file in a pool of jobs processes.  Each
+    LAUNCH gets a snapshot of the deck settings at that point.  The reports
+    are written by this process in deck order, so the output files come out
+    the same as a serial run.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    launches = []
+    for batch_file in batch_files:
+        batch_flite(batch_file, launch=lambda rkt: launches.append(copy.deepcopy(rkt)))
+
+    # the workers profile their own LAUNCHes and hand back the records
+    init = instrument.start if instrument.active() else None
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init) as pool:
+        for num, (fname, code, text, elapsed, rec) in enumerate(pool.map(launch_job, launches), start=1):
+            with instrument.phase('output'), open(fname, "w") as fp:
+                fp.write(text)
+            instrument.add_launch(rec)
+            print("job %3d  %-10s %-24s %8.3f sec" % (num, code, fname, elapsed))
+
+    print("%d launches in %.3f sec with %d jobs" % (len(launches), time.perf_counter() - start, jobs))
+
+
+def parse_value(dfu, typ, measure, args):
+    """ the typed value of a command line, DOUBLEs converted to SI """
+
+    itmp, dtmp, stmp = 0, 0.0, ""
+    if typ == "DOUBLE":
+        if len(args) > 2:
+            src_unit = args[2]
+        else:
+            src_unit = dfu
+
+        # convert the units to SI
+        dtmp = units.conv_unit(measure, float(args[1]), src_unit)
+    elif typ == "INTEGER":
+        if len(args) > 1:
+            itmp = int(args[1])
+        else:
+            itmp = 0
+    else:
+        if len(args) > 1:
+            stmp = args[1]
+        else:
+            stmp = None
 
+    return dtmp, itmp, stmp
 
-def batch_flite(batch_file):
+
+def set_value(rasp_bat, stage, cmd, args, dtmp, itmp, stmp):
+    """ apply a setting command, returns the (possibly new) current stage """
+
+    if cmd == "UNITS":
+        rasp_bat.units = stmp
+
+    elif cmd == "INTEGRATOR":
+        if stmp.lower() in ('euler', 'rk45'):
+            rasp_bat.integrator = stmp.lower()
+        else:
+            print("unknown integrator: ", stmp)
+
+    elif cmd == "RECORD":
+        if stmp.lower() in rasp.RECORD_MODES:
+            rasp_bat.record = stmp.lower()
+        else:
+            print("unknown record mode: ", stmp)
+
+    elif cmd == "HOME":
+        if stmp[-1] != os.sep:
+            rasp_bat.home = stmp + os.sep
+        else:
+            rasp_bat.home = stmp
+
+    elif cmd == "MODE":
+        if len(args) > 1:
+            if args[1].lower() in ('quiet', 'summa'):
+                rasp_bat.mode = 0
+            elif args[1].lower() in ('verbose',):
+                rasp_bat.mode = 1
+            elif args[1].lower() in ('debug',):
+                rasp_bat.mode = 2
+    elif cmd == "QUIET":
+        rasp_bat.mode = 0
+    elif cmd == "VERBOSE":
+        rasp_bat.mode = 1
+    elif cmd == "DEBUG":
+        rasp_bat.mode = 2
+
+    elif cmd == "DTIME":
+        rasp_bat.dtime = dtmp
+    elif cmd == "PRINTTIME":
+        rasp_bat.printtime = dtmp
+    elif cmd == "CONVERGE":
+        rasp_bat.converge = itmp
+    elif cmd == "EJECTION":
+        rasp_bat.ejection = itmp
+    elif cmd == "TRACE":
+        if stmp.lower() in TRACE_TYPES:
+            rasp_bat.trace = stmp.lower()
+        else:
+            print("unknown trace type: ", stmp)
+
+    elif cmd == "SITEPRESS":
+        rasp_bat.sitepress = dtmp
+    elif cmd == "SITETEMP":
+        rasp_bat.sitetemp = dtmp
+    elif cmd == "SITEALT":
+        rasp_bat.sitealt = dtmp
+    elif cmd == "FINALALT":
+        rasp_bat.finalalt = dtmp
+    elif cmd == "COASTTIME":
+        rasp_bat.coasttime = dtmp
+    elif cmd == "RAILLENGTH":
+        rasp_bat.raillength = dtmp
+    elif cmd == "DESTINATION":
+        rasp_bat.destination = stmp
+    elif cmd == "OUTFILE":
+        rasp_bat.outfile = stmp
+    elif cmd == "THETA":
+        rasp_bat.theta = dtmp
+    elif cmd == "NUMSTAGES":
+        rasp_bat.set_stages(itmp)
+    elif cmd == "NOSETYPE":
+        rasp_bat.nosetype = stmp
+    elif cmd == "DRAGCURVE":
+        rasp_bat.dragcurve = stmp
+    elif cmd == "STAGE":
+        if itmp > 0:
+            rasp_bat.set_stages(itmp)
+            stage = rasp_bat.stages[itmp - 1]
+    elif cmd == "STAGEDELAY":
+        stage.stagedelay = dtmp
+    elif cmd == "DIAMETER":
+        stage.diameter = dtmp
+    elif cmd == "NUMFINS":
+        stage.numfins = itmp
+    elif cmd == "FINTHICKNESS":
+        stage.finthickness = dtmp
+    elif cmd == "FINSPAN":
+        stage.finspan = dtmp
+    elif cmd == "DRYMASS":
+        stage.drymass = dtmp
+    elif cmd == "LAUNCHMASS":
+        stage.launchmass = dtmp
+    elif cmd == "CD":
+        stage.cd = dtmp
+    elif cmd == "ENGINEFILE":
+        stage.enginefile = stmp
+    elif cmd == "MOTORNAME":
+        stage.motorname = stmp
+    elif cmd == "NUMMOTOR":
+        stage.nummotor = itmp
+    else:
+        print("unknown cmd: ", cmd)
+
+    return stage
+
+
+def add_sweep(rasp_bat, stage, args):
+    """
+    SWEEP <setting> <from> <to> <step> [unit]   for numbers
+    SWEEP <setting> <value> <value> ...          for everything else
+
+    Stage settings apply to the stage current when the SWEEP is read.
+    """
+
+    name = args[1].lower() if len(args) > 1 else ""
+    if name not in MNEMONICS or MNEMONICS[name][1] in NO_SWEEP or MNEMONICS[name][2] is None:
+        print("can't sweep:", ' '.join(args))
+        return
+
+    dfu, cmd, typ, measure = MNEMONICS[name]
+
+    values = []
+    if typ == "DOUBLE":
+        if len(args) < 5:
+            print("short sweep:", ' '.join(args))
+            return
+        try:
+            first, last, step = float(args[2]), float(args[3]), float(args[4])
+        except ValueError:
+            print("bad sweep:", ' '.join(args))
+            return
+        # the step has to take first to last
+        if step == 0.0 or (last - first) * step < 0.0:
+            print("bad sweep step:", ' '.join(args))
+            return
+        unit = args[5] if len(args) > 5 else dfu
+        heading = "%s (%s)" % (name, unit) if unit else name
+
+        count = int(math.floor((last - first) / step + 1e-9)) + 1
+        for i in range(count):
+            v = "%g" % (first + i * step)
+            values.append((v, parse_value(dfu, typ, measure, [name, v, unit])))
+    else:
+        if len(args) < 3:
+            print("short sweep:", ' '.join(args))
+            return
+        heading = name
+        for v in args[2:]:
+            values.append((v, parse_value(dfu, typ, measure, [name, v])))
+
+    rasp_bat.sweeps.append(Sweep(heading, rasp_bat.stages.index(stage), cmd, name, values))
+
+
+def sweep_flite(rasp_bat):
+    """ fly every combination of the sweeps and write one CSV summary table """
+
+    base = copy.deepcopy(rasp_bat)
+    base.sweeps = []
+
+    fname = os.path.splitext(rasp_bat.outfile or "sweep")[0] + ".csv"
+    points = list(itertools.product(*(sw.values for sw in rasp_bat.sweeps)))
+
+    print("Sweeping ( %d points ) into %s ..." % (len(points), fname))
+
+    with instrument.launch(fname), instrument.phase('output'), open(fname, "w", newline='') as fp:
+        out = csv.writer(fp)
+        out.writerow([sw.heading for sw in rasp_bat.sweeps] + list(SWEEP_COLUMNS))
+
+        for point in points:
+            rkt = copy.deepcopy(base)
+            for sw, (_, value) in zip(rasp_bat.sweeps, point):
+                set_value(rkt, rkt.stages[sw.stage], sw.cmd, [sw.name], *value)
+
+            flight = rkt.as_flight()
+            flight.record = 'summary'
+            flight.compiled = rkt.compiled or len(points) > rasp.JIT_AFTER
+            results = rasp.calc(flight)
+
+            out.writerow([label for label, _ in point] + [
+                '/'.join(e.code for e in flight.e_info),
+                "%.2f" % results.max_alt, "%.3f" % results.t_max_alt,
+                "%.2f" % results.vrod(), "%.2f" % results.max_vel, "%.3f" % results.t_max_vel,
+                "%.2f" % results.vcoff(), "%.3f" % results.t_coff])
+
+
+def solve_flite(rasp_bat, stage, args):
+    """
+    SOLVE <setting> [<low> <high> [unit]]
+
+    Find the value of a stage setting (drymass, cd or stagedelay) that
+    gives an apogee of FINALALT, by Illinois false position between low and
+    high.  The rocket is built once and each trial only flies to apogee.
+    The answer is stored in the setting, so a LAUNCH that follows flies it.
+    """
+
+    name = args[1].lower() if len(args) > 1 else ""
+    if name not in MNEMONICS or MNEMONICS[name][1] not in SOLVABLE:
+        print("can't solve for:", ' '.join(args))
+        return
+
+    dfu, cmd, typ, measure = MNEMONICS[name]
+    attr, lo, hi = SOLVABLE[cmd]
+    unit = args[4] if len(args) > 4 else dfu
+
+    if len(args) == 3:
+        print("short solve:", ' '.join(args))
+        return
+    if len(args) > 3:
+        try:
+            lo = parse_value(dfu, typ, measure, [name, args[2], unit])[0]
+            hi = parse_value(dfu, typ, measure, [name, args[3], unit])[0]
+        except ValueError:
+            print("bad solve:", ' '.join(args))
+            return
+        if lo == hi:
+            print("bad solve bracket:", ' '.join(args))
+            return
+
+    # the rocket flies on the largest CD of the stages still on it, so the
+    # CD of a stage below one with a larger CD is never used
+    num = rasp_bat.stages.index(stage)
+    if cmd == "CD":
+        above = [(stg.cd, i + 1) for i, stg in enumerate(rasp_bat.stages[num + 1:], start=num + 1) if stg.cd > stage.cd]
+        if above:
+            cd, i = max(above)
+            print("can't solve for the cd of stage %d: stage %d has a larger cd (%g), so the rocket flies on that" % (
+                  num + 1, i, cd))
+            return
+
+    # SI per unit, for printing the trials in the unit of the deck
+    scale = parse_value(dfu, typ, measure, [name, "1", unit])[0] or 1.0
+
+    target = float(rasp_bat.finalalt)
+    if target <= 0.0:
+        print("SOLVE needs a FINALALT")
+        return
+
+    flight = rasp_bat.as_flight()
+    rstage = flight.rocket.stages[num]
+
+    def miss(x):
+        setattr(rstage, attr, x)
+        alt = rasp.apogee(flight)
+        print("  %-12s %12.4f %-4s  apogee %10.1f ft" % (name, x / scale, unit or "", alt * rasp.M2FT))
+        return alt - target
+
+    print("Solving %s for %.1f ft ( %s ) ..." % (name, target * rasp.M2FT, flight.e_info[0].code))
+
+    f_lo, f_hi = miss(lo), miss(hi)
+    if f_lo * f_hi > 0 and min(abs(f_lo), abs(f_hi)) > SOLVE_FTOL:
+        print("  %.1f ft is not between %g and %g %s" % (target * rasp.M2FT, lo / scale, hi / scale, unit or ""))
+        return
+
+    # Illinois: false position, halving the weight of an end that is kept twice
+    x, fx, side = lo, f_lo, 0
+    for _ in range(SOLVE_ITER):
+        if abs(f_lo) <= SOLVE_FTOL:
+            x, fx = lo, f_lo
+            break
+        if abs(f_hi) <= SOLVE_FTOL:
+            x, fx = hi, f_hi
+            break
+
+        x = (lo * f_hi - hi * f_lo) / (f_hi - f_lo)
+        fx = miss(x)
+        if abs(fx) <= SOLVE_FTOL or x in (lo, hi):
+            break
+
+        if fx * f_hi > 0:
+            hi, f_hi = x, fx
+            if side == -1:
+                f_lo /= 2
+            side = -1
+        else:
+            lo, f_lo = x, fx
+            if side == 1:
+                f_hi /= 2
+            side = 1
+
+    print("  %s = %.4f %s gives %.1f ft" % (name, x / scale, unit or "", (fx + target) * rasp.M2FT))
+    set_value(rasp_bat, stage, cmd, [name], x, 0, "")
+
+
+def batch_flite(batch_file, launch=None):
     # v4.2 subtle bug processing home directory ... I was writing a / at
     # the tail of * ArgBuf [2] -- Possibly on top of sombody else's data
     # space !  Adding a work buffer for doing the deed.
@@ -308,10 +803,16 @@ def batch_flite(batch_file):
     try:
         with open(batch_file, "r") as fp:
 
+            lines = fp.readlines()
+
             rasp_bat = RocketBat()
             stage = rasp_bat.stages[0]
 
-            for num, line in enumerate(fp.readlines(), start=1):
+            # loading the compiled kernel only pays off over many flights
+            launches = sum(1 for line in lines if line.split()[:1] and line.split()[0].lower() == "launch")
+            rasp_bat.compiled = launches > rasp.JIT_AFTER
+
+            for num, line in enumerate(lines, start=1):
                 # break up line and filter comments
                 args = []
                 for arg in line.split():
@@ -329,129 +830,70 @@ def batch_flite(batch_file):
 
                     dfu, cmd, typ, measure = MNEMONICS[args[0].lower()]
 
-                    itmp, dtmp, stmp = 0, 0.0, ""
                     if cmd == "TITLE":
                         if len(args) > 1:
                             rasp_bat.title = re.split(r'\s+', line.strip(), maxsplit=1)[1]
                         continue
                     elif cmd == "LAUNCH":
-                        to_da_moon_alice(rasp_bat)
+                        if rasp_bat.sweeps:
+                            sweep_flite(rasp_bat)
+                            rasp_bat.sweeps = []
+                        else:
+                            (launch or to_da_moon_alice)(rasp_bat)
+                        continue
+                    elif cmd == "SWEEP":
+                        add_sweep(rasp_bat, stage, args)
+                        continue
+                    elif cmd == "SOLVE":
+                        solve_flite(rasp_bat, stage, args)
                         continue
                     elif cmd == "QUIT":
                         return
                     elif cmd == "DUMP":
                         rasp_bat.dump()
                         break
-                    elif typ == "DOUBLE":
-                        if len(args) > 2:
-                            src_unit = args[2]
-                        else:
-                            src_unit = dfu
-
-                        # convert the units to SI
-                        dtmp = units.conv_unit(measure, float(args[1]), src_unit)
-                    elif typ == "INTEGER":
-                        if len(args) > 1:
-                            itmp = int(args[1])
-                        else:
-                            itmp = 0
-                    else:
-                        if len(args) > 1:
-                            stmp = args[1]
-                        else:
-                            stmp = None
-
-                    if cmd == "UNITS":
-                        rasp_bat.units = stmp
-
-                    elif cmd == "HOME":
-                        if stmp[-1] != os.sep:
-                            rasp_bat.home = stmp + os.sep
-                        else:
-                            rasp_bat.home = stmp
 
-                    elif cmd == "MODE":
-                        if len(args) > 1:
-                            if args[1].lower() in ('quiet', 'summa'):
-                                rasp_bat.mode = 0
-                            elif args[1].lower() in ('verbose',):
-                                rasp_bat.mode = 1
-                            elif args[1].lower() in ('debug',):
-                                rasp_bat.mode = 2
-                    elif cmd == "QUIET":
-                        rasp_bat.mode = 0
-                    elif cmd == "VERBOSE":
-                        rasp_bat.mode = 1
-                    elif cmd == "DEBUG":
-                        rasp_bat.mode = 2
-
-                    elif cmd == "SITEPRESS":
-                        rasp_bat.sitepress = dtmp
-                    elif cmd == "SITETEMP":
-                        rasp_bat.sitetemp = dtmp
-                    elif cmd == "SITEALT":
-                        rasp_bat.sitealt = dtmp
-                    elif cmd == "FINALALT":
-                        rasp_bat.finalalt = dtmp
-                    elif cmd == "COASTTIME":
-                        rasp_bat.coasttime = dtmp
-                    elif cmd == "RAILLENGTH":
-                        rasp_bat.raillength = dtmp
-                    elif cmd == "DESTINATION":
-                        rasp_bat.destination = stmp
-                    elif cmd == "OUTFILE":
-                        rasp_bat.outfile = stmp
-                    elif cmd == "THETA":
-                        rasp_bat.theta = dtmp
-                    elif cmd == "NUMSTAGES":
-                        rasp_bat.set_stages(itmp)
-                    elif cmd == "NOSETYPE":
-                        rasp_bat.nosetype = stmp
-                    elif cmd == "STAGE":
-                        if itmp > 0:
-                            rasp_bat.set_stages(itmp)
-                            stage = rasp_bat.stages[itmp - 1]
-                    elif cmd == "STAGEDELAY":
-                        stage.stagedelay = dtmp
-                    elif cmd == "DIAMETER":
-                        stage.diameter = dtmp
-                    elif cmd == "NUMFINS":
-                        stage.numfins = itmp
-                    elif cmd == "FINTHICKNESS":
-                        stage.finthickness = dtmp
-                    elif cmd == "FINSPAN":
-                        stage.finspan = dtmp
-                    elif cmd == "DRYMASS":
-                        stage.drymass = dtmp
-                    elif cmd == "LAUNCHMASS":
-                        stage.launchmass = dtmp
-                    elif cmd == "CD":
-                        stage.cd = dtmp
-                    elif cmd == "ENGINEFILE":
-                        stage.enginefile = stmp
-                    elif cmd == "MOTORNAME":
-                        stage.motorname = stmp
-                    elif cmd == "NUMMOTOR":
-                        stage.nummotor = itmp
-                    else:
-                        print("unknown cmd: ", cmd)
+                    dtmp, itmp, stmp = parse_value(dfu, typ, measure, args)
+                    stage = set_value(rasp_bat, stage, cmd, args, dtmp, itmp, stmp)
 
             rasp_bat.dump()
             rasp_bat.export()
+            if rasp_bat.mode == 2:
+                print(raspinfo.catalog)
 
     except OSError as e:
         print(e.strerror, e.filename)
 
 
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='nc', description=f'RASP batch decks (v{VERSION})')
+    parser.add_argument('--profile', metavar='FILE',
+                        help="time each phase of each LAUNCH, JSON report to FILE ('-' for stderr)")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+    parser.add_argument('raspfile', nargs='?', help="rasp batch file")
+
+    args = parser.parse_args()
+
+
 def main():
     if sys.platform == 'ios':
         os.chdir('test')
 
     print("\nRASP - Rocket Altitude Simulation Program V%s\n" % VERSION)
 
+    parse_commandline()
+
+    if args.profile:
+        instrument.start()
+
     print()
-    if len(sys.argv) > 1:
-        batch_flite(sys.argv[1])
+    if args.raspfile:
+        batch_flite(args.raspfile)
+
+    if args.profile:
+        instrument.write_report(args.profile, instrument.stop())
 
 
 if __name__ == '__main__':
@@ -104,13 +104,19 @@ struct motor {
 
 import os
 import sys
+import copy
 import math
 
 import nc
+import diverge
+import atmos
 import argparse
+import instrument
 import raspinfo
 import pathproc
-from collections import defaultdict, UserList
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple, UserList
 
 VERSION = "4.1b"
 
@@ -132,6 +138,9 @@ TEMP_CORRECTION = 1
 
 G = 9.806650
 DELTA_T = 0.001    # Time interval - 1ms
+PRINT_T = 0.1      # Time interval of the verbose output table
+RECORD_MODES = ('full', 'summary', 'decimated')
+JIT_AFTER = 10     # flights in a batch below which the compiled kernel does not pay for itself
 DT_DH = 0.006499   # degK per meter
 DT_DF = 0.001981   # degK per foot
 TEMP0 = 273.15     # Temp of air at Std Density at Sea Level
@@ -139,8 +148,6 @@ S_L_RHO = 1.29290  # Density of Air at STP ( 0C )
 STD_ATM = 29.92    # Standard Pressure
 
 LAUNCHALT = 0.00
-MAXALT = 118415    # Where the Stratosphere begins (ft)
-SPACEALT = 43610   # q&d fix
 
 # Define the 1st character on non-data output lines. This forces output to be gnuplot compatible.
 
@@ -188,6 +195,7 @@ class Rocket:
     def __init__(self, name=None):
         self.name = name
         self.nose = None
+        self.drag_model = None  # a diverge.DragModel, None for the one of the nose
         self.stages = []
 
     def maxd(self, first=0):
@@ -214,6 +222,11 @@ class Flight:
         self.coast_base = 0.0
 
         self.temp_correction = False
+        self.method = 'euler'    # integrator, 'euler' or 'rk45'
+        self.dt = DELTA_T        # Euler time step
+        self.print_t = PRINT_T   # time between rows of the verbose output
+        self.record = 'full'     # trace kept by calc, one of RECORD_MODES
+        self.compiled = False    # summary flown by raspjit where it can, for callers flying many
 
     def rocket_wt(self):
         # sum the result of stage_wt for each stage number
@@ -256,26 +269,84 @@ class Flight:
             raspinfo.print_engine_info(self.e_info[i], fp)
 
 
+# one time step of the flight, as yielded by simulate_stream
+Sample = namedtuple('Sample', 't alt vel acc mass thrust drag')
+
+
+class AeroProfile:
+    """
+    what the integrators need of the stack flying from stage index num up,
+    worked out once and fixed until the next staging
+    """
+
+    def __init__(self, flight, num, rocket_wt):
+        rocket = flight.rocket
+
+        self.num = num
+        self.stage = stage = rocket.stages[num]
+        self.engine = engine = flight.e_info[num]
+
+        # reference area: the widest body tube left plus the fins of this stage
+        d = rocket.maxd(num) * IN2M
+        self.ref_area = (math.pi * d * d * 0.25) + stage.fins.area()
+        self.drag_constant = 0.5 * rocket.cd(num) * self.ref_area
+        self.drag_model = diverge.model(rocket)
+
+        # mass schedule: weight at ignition, propellant burnt per N-sec of impulse
+        self.rocket_wt = rocket_wt
+        self.ntot = engine.ntot()
+        self.burn_mass = engine.m2 * stage.engnum
+
+        self.engnum = stage.engnum
+        self.burn_time = engine.t2()
+        self.stage_delay = stage.stage_delay
+
+
+def aero_profiles(flight):
+    """ an AeroProfile per stage, each stage dropping the spent one below it """
+
+    profiles = []
+    rocket_wt = flight.rocket_wt()
+    for num in range(len(flight.rocket.stages)):
+        if num:
+            rocket_wt -= flight.stage_wt(num - 1)
+        profiles.append(AeroProfile(flight, num, rocket_wt))
+
+    return profiles
+
+
 class Vector(UserList):
-    """ data vector that permits standard indexing as well as time-based indexing """
+    """
+    data vector that permits standard indexing as well as time-based indexing
+
+    The samples live in a packed array of doubles, an 8 byte slot apiece
+    rather than a list of boxed floats.
+    """
+
+    def __init__(self, init_val=None, dt=DELTA_T):
+        super().__init__()
+        self.data = array('d', init_val or ())
+        self.dt = dt
+
+    def __iter__(self):
+        return iter(self.data)
 
-    def __init__(self, init_val=None):
-        super().__init__(self)
-        if init_val:
-            self.data = list(init_val)
-        else:
-            self.data = []
-        
     def __getitem__(self, idx):
         if type(idx) in (int, slice):
             return self.data[idx]
         elif type(idx) is float:
-            idx = round(idx / DELTA_T)
+            if not self.dt:
+                raise IndexError("time index into a non-uniform vector")
+            idx = round(idx / self.dt)
             return self.data[idx]
 
 
 class Results:
-    def __init__(self):
+    __slots__ = ('rod', 'drag_bias', 't_rod', 't_coff', 'max_accel', 't_max_accel', 'min_accel', 't_min_accel',
+                 'max_vel', 't_max_vel', 'max_alt', 't_max_alt', 'mach1_0', 'rho_0', 'baro_press', 'base_temp',
+                 'site_alt', 'dt', 'print_t', 'events', 'tee', 'acc', 'vel', 'alt', 'mass', 'drag', 'thrust')
+
+    def __init__(self, dt=DELTA_T, print_t=PRINT_T):
         self.rod = 0.0
         self.drag_bias = 0
         self.t_rod = 0.0  # launch rod info
@@ -293,21 +364,30 @@ class Results:
         self.baro_press = 0.0
         self.base_temp = 0.0
         self.site_alt = 0.0
+        self.dt = dt  # sample interval of the trace, None if not uniform
+        self.print_t = print_t
 
         # how to keep the per-stage stats?
         self.events = []
 
-        self.tee = []
-        self.acc = Vector()
-        self.vel = Vector()
-        self.alt = Vector()
-        self.mass = []
-        self.drag = []
-        self.thrust = []
-
-    @staticmethod
-    def tindex(t):
-        return round(t / DELTA_T)
+        # the trace, one column per channel
+        self.tee = Vector(dt=dt)
+        self.acc = Vector(dt=dt)
+        self.vel = Vector(dt=dt)
+        self.alt = Vector(dt=dt)
+        self.mass = Vector(dt=dt)
+        self.drag = Vector(dt=dt)
+        self.thrust = Vector(dt=dt)
+
+    def tindex(self, t):
+        if self.dt:
+            return round(t / self.dt)
+
+        # nearest sample of a non-uniform trace
+        i = bisect_left(self.tee, t)
+        if i > 0 and (i == len(self.tee) or t - self.tee[i - 1] <= self.tee[i] - t):
+            i -= 1
+        return i
     
     def vcoff(self):
         return self.vel[self.tindex(self.t_coff)]
@@ -317,12 +397,30 @@ class Results:
 
     def vrod(self):
         return self.vel[self.tindex(self.t_rod)]
+
+    def amaxvel(self):
+        return self.alt[self.tindex(self.t_max_vel)]
+
+    def interp(self, vector, t):
+        """ vector linearly interpolated at time t, None outside the trace """
+
+        tee = self.tee
+        if not len(tee) or t < tee[0] or t > tee[-1]:
+            return None
+
+        i = bisect_left(tee, t)
+        if tee[i] == t:
+            return vector[i]
+
+        s = (t - tee[i - 1]) / (tee[i] - tee[i - 1])
+        return vector[i - 1] + s * (vector[i] - vector[i - 1])
         
     def add_event(self, time, desc):
         self.events.append((time, desc))
 
     def display(self, fp, verbose=False):
-        skip_count = 100
+        if self.dt:
+            skip_count = max(1, round(self.print_t / self.dt))
 
         if verbose:
             print(CH1, file=fp)
@@ -336,16 +434,25 @@ class Results:
                 CH1, "-----", "---------", "---------", "---------",
                 "-----------", "---------", "---------"), file=fp)
 
-            for i, tee in enumerate(self.tee[1:]):
-                if i % skip_count == 0:
-                    print_alt = self.alt[i] * M2FT
-                    print_vel = self.vel[i] * M2FT
-                    print_accel = self.acc[i] * M2FT
-                    print_mass = self.mass[i] * 1000  # I want my Mass in Grams
-
-                    print("%6.1f %10.1f %10.1f %10.2f %11.2f %10.3f %10.3f" % (
-                          tee, print_alt, print_vel, print_accel,
-                          print_mass, self.thrust[i], self.drag[i]), file=fp)
+            if self.dt:
+                rows = [(tee, i) for i, tee in enumerate(self.tee[1:]) if i % skip_count == 0]
+            else:
+                # first sample at or after each print time
+                rows, next_t = [], 0.0
+                for i, tee in enumerate(self.tee):
+                    if tee >= next_t - 1e-9:
+                        rows.append((tee, i))
+                        next_t = (math.floor(tee / self.print_t + 1e-6) + 1) * self.print_t
+
+            for tee, i in rows:
+                print_alt = self.alt[i] * M2FT
+                print_vel = self.vel[i] * M2FT
+                print_accel = self.acc[i] * M2FT
+                print_mass = self.mass[i] * 1000  # I want my Mass in Grams
+
+                print("%6.1f %10.1f %10.1f %10.2f %11.2f %10.3f %10.3f" % (
+                      tee, print_alt, print_vel, print_accel,
+                      print_mass, self.thrust[i], self.drag[i]), file=fp)
 
         # TODO: add this
         # fprintf(stream, "%c Stage %d Ignition at %5.2f sec.\n", ch1, this_stage + 1, t)
@@ -357,7 +464,7 @@ class Results:
         print("%c Launch rod velocity  =      %.1f feet/sec at %.1f feet ( %.2f sec )" % (
                CH1, self.vrod() * M2FT, self.rod * M2FT, self.t_rod), file=fp)
         print("%c Maximum velocity =          %.1f feet/sec at %.1f feet ( %.2f sec )" % (
-                CH1, self.max_vel * M2FT, self.alt[self.t_max_vel] * M2FT, self.t_max_vel), file=fp)
+                CH1, self.max_vel * M2FT, self.amaxvel() * M2FT, self.t_max_vel), file=fp)
         print("%c Cutoff velocity =           %.1f feet/sec at %.1f feet ( %.2f sec )" % (
                CH1, self.vcoff() * M2FT, self.acoff() * M2FT, self.t_coff), file=fp)
         print("%c Maximum acceleration =      %.1f feet/sec^2 at %.2f sec" % (
@@ -371,7 +478,33 @@ class Results:
               file=fp)
 
         print("#\n# " + '\n# '.join('{:.3f} {}'.format(t, d) for t, d in self.events), file=fp)
-        
+
+
+class Summary(Results):
+    """
+    Results that keep the samples needed by display() as scalars, so the
+    trace can be empty or thinned out to the print interval
+    """
+
+    def __init__(self, dt=DELTA_T, print_t=PRINT_T):
+        super().__init__(dt, print_t)
+        self.v_rod = 0.0      # velocity at t_rod
+        self.v_coff = 0.0     # velocity at t_coff
+        self.a_coff = 0.0     # altitude at t_coff
+        self.a_max_vel = 0.0  # altitude at t_max_vel
+
+    def vrod(self):
+        return self.v_rod
+
+    def vcoff(self):
+        return self.v_coff
+
+    def acoff(self):
+        return self.a_coff
+
+    def amaxvel(self):
+        return self.a_max_vel
+
 
 def get_str(prompt, default):
     entry = input(f"{prompt} [{default}]  ")
@@ -403,10 +536,6 @@ def get_float(prompt, default):
             print("Bad Value")
 
 
-def standard_press(alt):
-    return STD_ATM * math.exp(5.256 * math.log(1 - (0.00000688 * alt * M2FT)))
-
-
 def choices(defaults):
     flight = Flight()
 
@@ -489,7 +618,7 @@ def choices(defaults):
  
     flight.base_temp = (flight.faren_temp - 32) * 5 / 9 + 273.15  # convert to degK
  
-    baro_press = standard_press(flight.site_alt)
+    baro_press = atmos.standard_press(flight.site_alt)
     flight.baro_press = get_float("Barometric Pressure at Launch Site", baro_press)
  
     flight.rod = get_float("Launch Rod Length ( inch )", defaults['rod'] / IN2M) * IN2M
@@ -510,17 +639,96 @@ def choices(defaults):
     return flight
 
 
+def calc_compiled(flight):
+    """
+    raspjit.calc of a summary flight, or None to fly it in Python: when
+    the flight does not ask for it (flight.compiled), numba is missing,
+    RASP_NOJIT is set or the kernel cannot fly it
+    """
+
+    if not flight.compiled or os.environ.get('RASP_NOJIT'):
+        return None
+
+    with instrument.phase('flight'):
+        import raspjit
+        return raspjit.calc(flight) if raspjit.enabled else None
+
+
 def calc(flight):
+    if flight.method == 'rk45':
+        with instrument.phase('flight'):
+            return calc_adaptive(flight)
+
+    # keep every keep'th sample of the trace, none at all for a summary
+    if flight.record == 'summary':
+        results = calc_compiled(flight)
+        if results is not None:
+            return results
+
+        keep = 0
+        results = Summary(None, flight.print_t)
+    elif flight.record == 'decimated':
+        keep = max(1, round(flight.print_t / flight.dt))
+        results = Summary(None, flight.print_t)
+    else:
+        keep = 1
+        results = Results(flight.dt, flight.print_t)
+
+    stream = simulate_stream(flight, results)
+    if instrument.profile is not None:
+        stream = instrument.flight_phases(stream, results)
+
+    if not keep:
+        for _ in stream:
+            pass
+        return results
+
+    tee_append = results.tee.append
+    acc_append = results.acc.append
+    vel_append = results.vel.append
+    alt_append = results.alt.append
+    mass_append = results.mass.append
+    drag_append = results.drag.append
+    thrust_append = results.thrust.append
+
+    n = keep - 1  # always keep the t=0 sample
+    for t, alt, vel, accel, mass, thrust, drag in stream:
+        n += 1
+        if n == keep:
+            n = 0
+            tee_append(t)
+            acc_append(accel)
+            vel_append(vel)
+            alt_append(alt)
+            mass_append(mass)
+            drag_append(drag)
+            thrust_append(thrust)
+
+    return results
+
+
+def simulate_stream(flight, results=None):
+    """
+    Fly the flight with the Euler integrator, yielding a Sample for t=0 and
+    for every time step after it.
+
+    The summary and events go into results (a Summary is made if none is
+    given) and are complete once the generator is exhausted.  A consumer is
+    free to stop early, e.g. at apogee, and nothing is stored meanwhile.
+    """
+
+    dt = flight.dt                    # time step
     stage_time = 0.0                  # elapsed time for current stage
     start_burn = 0
     coast_time = 0.00                 # kjh to coast after burnout
     drag = 0.0                        # kjh added to print Drag in Nt
     alt = LAUNCHALT
-    vel = 0.0
-    sum_o_thrust = 0.0                # kjh added to reduce pro mass ~ thrust
+    vel = prev_vel = 0.0
     launched = False                  # indicates rocket has lifted off
-    
-    results = Results()
+    v_rod = v_coff = a_coff = a_max_vel = 0.0
+
+    if results is None:
+        results = Summary(None, flight.print_t)
 
     results.mach1_0 = math.sqrt(MACH_CONST * flight.base_temp)
     results.baro_press = flight.baro_press
@@ -530,86 +738,64 @@ def calc(flight):
 
     # rho == Air Density for drag calc
     results.rho_0 = (flight.baro_press * IN2PASCAL) / (GAS_CONST_AIR * flight.base_temp)
+    atm_lookup = atmos.table(flight.site_alt, flight.base_temp, results.rho_0, flight.temp_correction).lookup
 
-    mass = rocket_wt = flight.rocket_wt()
+    # the aerodynamics and masses only change at staging
+    profiles = aero_profiles(flight)
+    last = len(profiles) - 1
+    aero = profiles[0]
+    drag_bias = aero.drag_model.bias
 
-    stage = flight.rocket.stages[0]
-    engine = flight.e_info[0]
+    stage, engine = aero.stage, aero.engine
+    get_thrust, get_impulse = engine.get_thrust, engine.impulse
+    mass = rocket_wt = aero.rocket_wt
 
     # figure start and stop times for motor burn and stage
-    end_burn = engine.t2()
-    end_stage = end_burn + stage.stage_delay
+    end_burn = aero.burn_time
+    end_stage = end_burn + aero.stage_delay
 
-    # What is the effective Diameter and drag coeff
-    stage_diam = flight.rocket.maxd()
-    drag_coff = flight.rocket.cd()
-        
     # c = r * M_PI * drag_coff * d * d * 0.125;
     # c = r * drag_constant
+    drag_constant = aero.drag_constant
 
     # kjh wants to see thrust at t=0 if there is any ...
-    results.tee.append(0.0)
-    results.alt.append(LAUNCHALT)
-    results.vel.append(0.0)
-    results.mass.append(mass)
-    results.drag.append(0.0)
     t, thrust = engine.thrust[0]
     if t == 0.0 and thrust != 0.0:
-        results.thrust.append(thrust)
-        results.acc.append((thrust - drag) / mass - G)
+        yield Sample(0.0, LAUNCHALT, 0.0, (thrust - drag) / mass - G, mass, thrust, 0.0)
     else:
-        results.thrust.append(0.0)
-        results.acc.append(0.0)
-  
+        yield Sample(0.0, LAUNCHALT, 0.0, 0.0, mass, 0.0, 0.0)
+
+    new_sample = tuple.__new__  # skips the keyword handling of Sample()
+
     # Launch Loop
     t = 0.000000
     while True:
         # Calculate decreasing air density
 
         # todo: r = air_density (alt,site_alt,base_temp);
-        y = results.alt[-1]
-        if y > SPACEALT:
-            r = 0
-        elif y > MAXALT:
-            # r = 1.7187 * exp(-1.5757e-4 * y);
-            r = 1.9788 * math.exp(-1.5757e-4 * y)
-        else:
-            r = results.rho_0 * math.exp(4.255 * math.log(1 - (y * 2.2566e-5)))
-
-        if flight.temp_correction:
-            dt = isa_temp(flight.base_temp, y)
-            results.mach1_0 = math.sqrt(MACH_CONST * dt)
-
-        # is this a result?
-        d = stage_diam * IN2M
-        drag_constant = 0.5 * drag_coff * ((math.pi * d * d * 0.25) + stage.fins.area())
+        # r = results.rho_0 * math.exp(4.255 * math.log(1 - (y * 2.2566e-5)))
+        # now tabulated by atmos, along with the temperature corrected Mach 1
+        r, results.mach1_0 = atm_lookup(alt)
 
         c = r * drag_constant
 
-        t += DELTA_T
-        stage_time += DELTA_T
+        t += dt
+        stage_time += dt
 
         # handle staging, if needed
-        if t > end_stage and stage.number < len(flight.rocket.stages):
-            sum_o_thrust = 0.0
-
-            # this gets the next stage due to offset between number and index
-            stage = flight.rocket.stages[stage.number]
-            engine = flight.e_info[stage.number]
-            
-            stage_wt = flight.stage_wt(stage.number - 1)
-            rocket_wt -= stage_wt
+        if t > end_stage and aero.num < last:
+            # the next stage, its profile has the spent stage dropped
+            aero = profiles[aero.num + 1]
+            stage, engine = aero.stage, aero.engine
+            get_thrust, get_impulse = engine.get_thrust, engine.impulse
+            rocket_wt = aero.rocket_wt
 
             stage_time = 0
             start_burn = t
-            end_burn = start_burn + engine.t2
-            end_stage = end_burn + stage.stage_delay
+            end_burn = start_burn + aero.burn_time
+            end_stage = end_burn + aero.stage_delay
             results.add_event(t, f'start_burn stage {stage.number}')
 
-            # What is the effective Diameter and drag coeff of remaining stages
-            stage_diam = flight.rocket.maxd(stage.number - 1)
-            drag_coff = flight.rocket.cd(stage.number - 1)
-
             """
                  1
             c = --- * PI * d ^ 2 * R * k
@@ -628,21 +814,18 @@ def calc(flight):
             """
             # c = r * M_PI * drag_coff * d * d * 0.125
 
-            d = stage_diam * IN2M
-            drag_constant = 0.5 * drag_coff * ((math.pi * d * d * 0.25) + stage.fins.area())
-
+            drag_constant = aero.drag_constant
             c = r * drag_constant
 
             results.events.append((t, f"Stage {stage.number} ignition"))
 
         # Handle the powered phase of the boost
         if start_burn <= t <= end_burn:
-            thrust = engine.get_thrust(t) * stage.engnum
+            thrust = get_thrust(t - start_burn) * aero.engnum
 
             # kjh changed this to consume propellant at thrust rate
-            sum_o_thrust += (thrust * DELTA_T)
-            m1 = sum_o_thrust / (engine.ntot() * stage.engnum)
-            m1 *= engine.m2 * stage.engnum
+            m1 = get_impulse(t - start_burn) / aero.ntot
+            m1 *= aero.burn_mass
 
             # This is the Original Method
             #
@@ -657,7 +840,7 @@ def calc(flight):
             thrust = 0.0
             results.add_event(t, f'end_burn stage {stage.number}') 
 
-            if not results.t_coff and stage == flight.rocket.stages[-1]:
+            if not results.t_coff and aero.num == last:
                 results.t_coff = t
 
         """
@@ -671,10 +854,10 @@ def calc(flight):
         """
 
         # average last two vel values
-        avg_vel = sum(results.vel[-2:]) / 2
+        avg_vel = (prev_vel + vel) / 2
 
         # kjh Added M,C&B Model for TransSonic Region
-        results.drag_bias = drag_diverge(flight.rocket.nose, results.mach1_0, vel)
+        results.drag_bias = drag_bias(results.mach1_0, vel)
 
         """
         # kjh replaced this with DragDiverge
@@ -706,14 +889,15 @@ def calc(flight):
         # drag = - ( cc * vel * vel ) ;
         drag = - (cc * avg_vel * avg_vel)  # kjh changed this 05-23-96
 
-        if launched and results.vel[-1] <= 0:
+        if launched and vel <= 0:
             drag = - drag
             accel = (drag / mass) - G  # kjh added this
         else:
             accel = ((thrust + drag) / mass) - G
 
-        vel = vel + accel * DELTA_T
-        alt = alt + vel * DELTA_T
+        prev_vel = vel
+        vel = vel + accel * dt
+        alt = alt + vel * dt
 
         # test for lift-off and apogee
         if vel > 0:
@@ -721,11 +905,190 @@ def calc(flight):
         elif not launched and vel < 0:
             alt = vel = accel = 0  # can't fall off pad!
         elif launched and vel < 0:
-            coast_time += DELTA_T  # time past burnout
+            coast_time += dt  # time past burnout
 
             if alt <= 0.0 or coast_time > flight.coast_base:  # kjh to coast a while
                 break  # apogee, all done
 
+        yield new_sample(Sample, (t, alt, vel, accel, mass, thrust, drag))
+
+        if t == results.t_coff:
+            v_coff = vel
+            a_coff = alt
+
+        if alt <= flight.rod and vel > 0:
+            results.t_rod = t
+            v_rod = vel
+
+        # do max evaluations
+        if accel > results.max_accel:
+            results.max_accel = accel
+            results.t_max_accel = t
+
+        elif accel < results.min_accel:
+            results.min_accel = accel
+            results.t_min_accel = t
+
+        if vel > results.max_vel:
+            results.max_vel = vel
+            results.t_max_vel = t
+            a_max_vel = alt
+
+        if alt > results.max_alt:
+            results.max_alt = alt
+            results.t_max_alt = t
+
+        if not launched and aero.num == last and t >= end_stage:
+            break  # never left the pad
+
+    if isinstance(results, Summary):
+        results.v_rod = v_rod
+        results.v_coff = v_coff
+        results.a_coff = a_coff
+        results.a_max_vel = a_max_vel
+
+
+# Dormand-Prince 5(4) tableau
+DP_C = (0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0, 1.0)
+DP_A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+DP_E = (71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+RK_RTOL = 1e-7     # relative error allowed per step
+RK_ATOL = 1e-7     # absolute error allowed per step
+RK_H0 = 0.001      # first step
+RK_HMAX = 0.5      # longest step
+
+
+def dp_step(deriv, t, y, h, k1):
+    """ one Dormand-Prince step, returns the new state, its derivative and the error estimate """
+
+    k = [k1]
+    for i in range(1, 7):
+        yi = [yj + h * sum(a * kk[j] for a, kk in zip(DP_A[i], k)) for j, yj in enumerate(y)]
+        k.append(deriv(t + DP_C[i] * h, yi))
+
+    # the 7th stage is evaluated at the 5th order solution (FSAL)
+    err = [h * sum(e * kk[j] for e, kk in zip(DP_E, k)) for j in range(len(y))]
+
+    return yi, k[6], err
+
+
+def hermite(t0, y0, f0, t1, y1, f1, t):
+    """ cubic Hermite interpolation of the state inside a step """
+
+    h = t1 - t0
+    s = (t - t0) / h
+    h00 = (1 + 2 * s) * (1 - s) * (1 - s)
+    h10 = s * (1 - s) * (1 - s)
+    h01 = s * s * (3 - 2 * s)
+    h11 = s * s * (s - 1)
+
+    return [a * h00 + h * fa * h10 + b * h01 + h * fb * h11 for a, fa, b, fb in zip(y0, f0, y1, f1)]
+
+
+def hermite_root(t0, y0, f0, t1, y1, f1, j, level=0.0):
+    """ time inside a step where component j of the interpolated state crosses level """
+
+    lo, hi = t0, t1
+    sign = y0[j] - level
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if (hermite(t0, y0, f0, t1, y1, f1, mid)[j] - level) * sign > 0:
+            lo = mid
+        else:
+            hi = mid
+
+    return (lo + hi) / 2
+
+
+def calc_adaptive(flight, rtol=RK_RTOL, atol=RK_ATOL):
+    """
+    Integrate the flight with an adaptive Dormand-Prince RK45 solver.
+
+    The state is (altitude, velocity, impulse delivered by the current stage).
+    Steps never straddle a thrust curve node, burnout or staging, apogee and
+    ground contact are located on the interpolated state, and the error
+    control takes care of the transonic region.  The trace holds the
+    accepted steps plus samples at every print_t and at the events, so it is
+    not uniform (Results.dt is None).
+    """
+
+    results = Results(None, flight.print_t)
+
+    results.mach1_0 = math.sqrt(MACH_CONST * flight.base_temp)
+    results.baro_press = flight.baro_press
+    results.base_temp = flight.base_temp
+    results.site_alt = flight.site_alt
+    results.rod = flight.rod
+    results.rho_0 = (flight.baro_press * IN2PASCAL) / (GAS_CONST_AIR * flight.base_temp)
+    atm = atmos.table(flight.site_alt, flight.base_temp, results.rho_0, flight.temp_correction)
+
+    profiles = aero_profiles(flight)
+    drag_factor = profiles[0].drag_model.factor
+
+    # current stage, see begin_stage()
+    num = 0
+    stage = engine = None
+    rocket_wt = 0.0
+    start_burn = end_burn = end_stage = 0.0
+    drag_constant = 0.0
+    breaks = []
+
+    launched = False
+    t_apogee = None
+    t_end = None
+
+    def begin_stage(t):
+        nonlocal stage, engine, rocket_wt, start_burn, end_burn, end_stage, drag_constant, breaks
+
+        aero = profiles[num]
+        stage, engine = aero.stage, aero.engine
+        rocket_wt = aero.rocket_wt
+        start_burn = t
+        end_burn = start_burn + aero.burn_time
+        end_stage = end_burn + aero.stage_delay
+        drag_constant = aero.drag_constant
+
+        breaks = sorted({start_burn + node.t for node in engine.thrust} | {end_burn, end_stage})
+
+    def forces(t, y):
+        """ acceleration, thrust, drag and mass for state y at time t """
+
+        alt, vel, impulse = y
+
+        if start_burn <= t <= end_burn:
+            thrust = engine.get_thrust(t - start_burn) * stage.engnum
+        else:
+            thrust = 0.0
+
+        mass = rocket_wt - impulse / engine.ntot() * engine.m2
+
+        r, mach = atm.exact(max(alt, 0.0))
+
+        drag = - r * drag_constant * drag_factor(vel / mach) * vel * abs(vel)
+        accel = ((thrust + drag) / mass) - G
+
+        if not launched and vel <= 0 and accel < 0:
+            accel = 0.0  # can't fall off pad!
+
+        return accel, thrust, drag, mass
+
+    def deriv(t, y):
+        accel, thrust, _, _ = forces(t, y)
+        return [y[1], accel, thrust]
+
+    def record(t, y):
+        alt, vel, _ = y
+        accel, thrust, drag, mass = forces(t, y)
+
         results.tee.append(t)
         results.acc.append(accel)
         results.vel.append(vel)
@@ -734,14 +1097,10 @@ def calc(flight):
         results.drag.append(drag)
         results.thrust.append(thrust)
 
-        if alt <= flight.rod and vel > 0:
-            results.t_rod = t
-
         # do max evaluations
         if accel > results.max_accel:
             results.max_accel = accel
             results.t_max_accel = t
-
         elif accel < results.min_accel:
             results.min_accel = accel
             results.t_min_accel = t
@@ -754,9 +1113,227 @@ def calc(flight):
             results.max_alt = alt
             results.t_max_alt = t
 
+    def step_to(t, y, f, t1):
+        """ exact (unchecked) step to t1, used to land on an event """
+        y1, f1, _ = dp_step(deriv, t, y, t1 - t, f)
+        return y1, f1
+
+    begin_stage(0.0)
+
+    t = 0.0
+    y = [LAUNCHALT, 0.0, 0.0]
+    f = deriv(t, y)
+    h = RK_H0
+    n_print = 1
+    record(t, y)
+
+    while True:
+        # never step across a discontinuity
+        stop = next((b for b in breaks if b > t + 1e-12), None)
+        if t_end is not None and (stop is None or t_end < stop):
+            stop = t_end
+
+        hs = min(h, RK_HMAX)
+        if stop is not None and t + hs >= stop - 1e-12:
+            hs = stop - t
+
+        y1, f1, err = dp_step(deriv, t, y, hs, f)
+        scale = [atol + rtol * max(abs(a), abs(b)) for a, b in zip(y, y1)]
+        norm = max(abs(e) / sc for e, sc in zip(err, scale))
+
+        if norm > 1.0:
+            h = hs * max(0.2, 0.9 * norm ** -0.2)
+            continue
+
+        h = hs * min(5.0, 0.9 * norm ** -0.2) if norm else hs * 5.0
+        t1 = t + hs
+
+        # events inside the step
+        event = None
+        if launched and y[1] > 0 >= y1[1]:
+            event = 'apogee'
+            t1 = hermite_root(t, y, f, t1, y1, f1, 1)
+        elif t_apogee is not None and y1[0] <= 0.0:
+            event = 'ground'
+            t1 = hermite_root(t, y, f, t1, y1, f1, 0)
+        if event:
+            y1, f1 = step_to(t, y, f, t1)
+            if event == 'apogee':
+                y1[1] = 0.0
+
+        # samples inside the step, at print times, rod clearance and max velocity
+        inside = []
+        while n_print * flight.print_t < t1 + 1e-9:
+            if n_print * flight.print_t < t1 - 1e-9:
+                inside.append(n_print * flight.print_t)
+            n_print += 1
+
+        if y[0] <= flight.rod < y1[0]:
+            results.t_rod = hermite_root(t, y, f, t1, y1, f1, 0, flight.rod)
+            inside.append(results.t_rod)
+
+        if f[1] > 0 >= f1[1] and not event:
+            # peak velocity, where the acceleration changes sign
+            inside.append(t + (t1 - t) * f[1] / (f[1] - f1[1]))
+
+        for ti in sorted(inside):
+            record(ti, hermite(t, y, f, t1, y1, f1, ti))
+
+        t, y, f = t1, y1, f1
+        if y[1] > 0:
+            launched = True  # LIFT-OFF
+        record(t, y)
+
+        if event == 'apogee':
+            t_apogee = t
+            t_end = t_apogee + flight.coast_base
+        if event == 'ground' or (t_end is not None and t >= t_end - 1e-12):
+            break
+
+        if not launched and num + 1 == len(profiles) and t >= end_stage:
+            break  # never left the pad
+
+        if abs(t - end_burn) < 1e-12:
+            results.add_event(t, f'end_burn stage {stage.number}')
+            if num + 1 == len(profiles):
+                results.t_coff = t
+
+        if abs(t - end_stage) < 1e-12 and num + 1 < len(profiles):
+            # drop the spent stage and light the next one
+            num += 1
+            begin_stage(t)
+            y = [y[0], y[1], 0.0]
+            f = deriv(t, y)
+            h = RK_H0
+
+            results.add_event(t, f'start_burn stage {stage.number}')
+            results.add_event(t, f"Stage {stage.number} ignition")
+
     return results
 
 
+def convergence(flight, results=None):
+    """
+    fly again at half the time step, returns the apogee at dt and at dt/2.
+    RK45 picks its own steps, so it is flown again with half the error
+    tolerances instead.
+    """
+
+    if results is None:
+        results = calc(flight)
+
+    if flight.method == 'rk45':
+        return results.max_alt, calc_adaptive(flight, RK_RTOL / 2, RK_ATOL / 2).max_alt
+
+    half = copy.copy(flight)
+    half.dt = flight.dt / 2
+    half.record = 'summary'
+
+    return results.max_alt, calc(half).max_alt
+
+
+def apogee(flight):
+    """ fly until the rocket turns over, returns the highest altitude reached """
+
+    if flight.method == 'rk45':
+        return calc(flight).max_alt
+
+    results = Summary(None, flight.print_t)
+    stream = simulate_stream(flight, results)
+    if instrument.profile is not None:
+        stream = instrument.flight_phases(stream, results)
+
+    top = 0.0
+    launched = False
+    for sample in stream:
+        if sample.vel > 0:
+            launched = True
+        elif launched and sample.vel < 0:
+            break  # past apogee, no need to coast down
+
+        if sample.alt > top:
+            top = sample.alt
+
+    stream.close()
+    return top
+
+
+def last_burnout(flight):
+    """ burnout of the last stage, staging waits for the previous burnout plus its delay """
+
+    start = burnout = 0.0
+    for stage, engine in zip(flight.rocket.stages, flight.e_info):
+        burnout = start + engine.t2()
+        start = burnout + stage.stage_delay
+
+    return burnout
+
+
+def ejection_coast(flight):
+    """
+    a coast past apogee that takes the trace beyond the longest ejection
+    delay of the last stage motor: apogee comes after burnout, so burnout
+    plus the delay is enough
+    """
+    return last_burnout(flight) + max(flight.e_info[-1].delay, default=0)
+
+
+def ejection(flight, results):
+    """
+    Look up each ejection delay of the last stage motor in the trace.
+    Returns the burnout time, the ideal delay and a list of
+    (delay, time, altitude, velocity), the last two None when the charge
+    fires after the end of the trace.
+    """
+
+    burnout = last_burnout(flight)
+
+    delays = []
+    for delay in flight.e_info[-1].delay:
+        t = burnout + delay
+        delays.append((delay, t, results.interp(results.alt, t), results.interp(results.vel, t)))
+
+    return burnout, results.t_max_alt - burnout, delays
+
+
+def print_ejection(fp, flight, results):
+    burnout, ideal, delays = ejection(flight, results)
+
+    print(CH1, file=fp)
+    print("%c Ejection:  %s burnout at %.2f sec, apogee at %.2f sec, ideal delay = %.1f sec" % (
+          CH1, flight.e_info[-1].code, burnout, results.t_max_alt, ideal), file=fp)
+    print("%c %7s %8s %10s %10s" % (CH1, "Delay", "Time", "Altitude", "Velocity"), file=fp)
+    print("%c %7s %8s %10s %10s" % (CH1, "(Sec)", "(Sec)", "(Feet)", "(Feet/Sec)"), file=fp)
+
+    for delay, t, alt, vel in delays:
+        if alt is None:
+            print("%c %7d %8.2f %10s %10s" % (CH1, delay, t, "-", "-"), file=fp)
+        else:
+            print("%c %7d %8.2f %10.1f %10.1f" % (CH1, delay, t, alt * M2FT, vel * M2FT), file=fp)
+
+    if delays:
+        best = min(delays, key=lambda d: abs(d[0] - ideal))[0]
+        print("%c Closest available delay = %d sec ( %+.1f sec from apogee )" % (CH1, best, best - ideal), file=fp)
+
+    if any(alt is None for _, _, alt, _ in delays):
+        print("%c ( - fires after the end of the trace: on the ground or past COASTTIME )" % CH1, file=fp)
+
+
+def print_convergence(fp, flight, results=None):
+    alt, half_alt = convergence(flight, results)
+    delta = half_alt - alt
+
+    print(CH1, file=fp)
+    if flight.method == 'rk45':
+        print("%c Convergence:  apogee %.1f feet at rtol = atol = %g, %.1f feet at tol/2" % (
+              CH1, alt * M2FT, RK_RTOL, half_alt * M2FT), file=fp)
+    else:
+        print("%c Convergence:  apogee %.1f feet at dt = %g sec, %.1f feet at dt/2" % (
+              CH1, alt * M2FT, flight.dt, half_alt * M2FT), file=fp)
+    print("%c               delta = %.2f feet (%.3f%%)" % (
+          CH1, delta * M2FT, 100 * delta / alt if alt else 0.0), file=fp)
+
+
 def display_flight(flight, fp):
     for stage in range(len(flight.rocket.stages)):
         print("%c Stage Weight [%d]:  %9.4f" % (CH1, stage + 1, flight.totalwt(stage)), file=fp)
@@ -784,62 +1361,19 @@ def get_nose(prompt, default):
 
 
 def drag_diverge(nose_type, mach_1, velocity):
+    """ the exact M,C&B drag bias, the integrators use the tables in diverge """
+    return diverge.for_nose(nose_type).factor(velocity / mach_1)
 
-    mach_number = velocity / mach_1
-
-    if mach_number <= 0.9 or mach_number <= 0.0:
-        return 1.0
-
-    if NOSES[nose_type] == 2:  # Rounded Noses
-        if mach_number <= 1.2:
-            diverge = 1.0 + 4.88 * (mach_number - 0.9) ** 1.1
-        elif mach_number < 2.0:
-            diverge = 2.0 + 0.30 * math.exp(-5.75 * (mach_number - 1.2))
-        else:
-            diverge = 2.0
-    else:  # Sharp Noses
-        if mach_number <= 1.05:
-            diverge = mach_number - 0.9
-            diverge *= diverge
-            diverge = 1.0 + 35.5 * diverge
-        elif mach_number < 2.0:
-            diverge = 1.27 + 0.53 * math.exp(-5.2 * (mach_number - 1.05))
-        else:
-            diverge = 1.27
-          
-    return diverge
-
-
-def isa_temp(base_temp, alt):
-    if alt <= 11000:
-        dt = base_temp - alt * 0.0065
-    elif alt <= 20000:
-        dt = 216.65
-    elif alt <= 32000:
-        dt = 228.65 + (alt - 32000) * 0.0010
-    elif alt <= 47000:
-        dt = 228.65 + (alt - 47000) * 0.0028
-    elif alt <= 51000:
-        dt = 270.65
-    elif alt <= 71000:
-        dt = 214.65 - (alt - 71000) * 0.0028
-    elif alt <= 84852:
-        dt = 186.95 - (alt - 84852) * 0.0020
-    else:
-        dt = 186.95
-
-    if dt < 0:
-        dt = 0.0
-
-    return dt
 
-    
 def parse_commandline():
     global args, parser
 
     parser = argparse.ArgumentParser(prog='raspinfo', description=f'Dump RASP engine info (v{VERSION})')
     parser.add_argument('-d', '--debug', action='store_true', help='debug output')
     parser.add_argument('-q', '--quiet', action='store_true', help="be quiet about it")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="run LAUNCHes in N processes")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="time each phase of each LAUNCH, JSON report to FILE ('-' for stderr)")
     parser.add_argument('--version', action='version', version=f'v{VERSION}')
     parser.add_argument('raspfiles', nargs='*', help="rasp batch files")
 
@@ -880,18 +1414,28 @@ def main():
     defaults['baro_press'] = STD_ATM
     defaults['rod'] = ROD
 
+    if args.profile:
+        instrument.start()
+
     # this is the batch mode block ( see n.c )
     if args.raspfiles:
-        for rasp in args.raspfiles:
-            nc.batch_flite(rasp)
+        if args.jobs > 1:
+            nc.batch_parallel(args.raspfiles, args.jobs)
+        else:
+            for rasp in args.raspfiles:
+                nc.batch_flite(rasp)
     else:
         while True:
             flight = choices(defaults)
 
-            with open(flight.fname) as fp:
-                flight.dump_header(fp)
+            with instrument.launch(flight.fname) as rec, open(flight.fname) as fp:
+                if rec is not None:
+                    rec['motor'] = flight.e_info[0].code
+                with instrument.phase('output'):
+                    flight.dump_header(fp)
                 results = calc(flight)
-                results.display(fp)
+                with instrument.phase('output'):
+                    results.display(fp)
 
             ans = input("\nDo Another One? ")
             if ans == "y" or ans == "Y":
@@ -899,6 +1443,9 @@ def main():
             else:
                 break
 
+    if args.profile:
+        instrument.write_report(args.profile, instrument.stop())
+
 
 if __name__ == '__main__':
     # todo: this is to work around pythonista bugs with the debugger
@@ -2,13 +2,27 @@
 parse and display eng (engine) files
 """
 
+import os
 import sys
+import json
 import math
+import mmap
 import argparse
-from collections import namedtuple
+from array import array
+from bisect import bisect_left
+from collections import namedtuple, OrderedDict
+
+import instrument
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 VERSION = '5.0'
 ENG_NAME = "rasp.eng"  # name of engine database file
+INDEX_EXT = ".idx"     # engine file index sidecar, see load_index()
+CATALOG_SIZE = 256     # parsed motors kept by the catalog
 CH1 = '#'
 
 engine_info = {
@@ -28,6 +42,9 @@ engine_info = {
 
 Thrust = namedtuple('Thrust', 't thrust')
 
+# where a motor lives in the engine file, plus enough to pick motors without parsing them
+IndexEntry = namedtuple('IndexEntry', 'offset diam dlen mfg ntot wt m2 npeak t2')
+
 
 class Engine:
     def __init__(self, mfg, code, m2, diam, dlen, wt, delay):
@@ -40,40 +57,161 @@ class Engine:
         self.delay = delay
         self.thrust = []
 
+        # compiled thrust curve, see compile()
+        self.times = None
+        self.thrusts = None
+        self.cum_impulse = None
+        self._rtimes = None
+        self._seg = 0
+
+        # derived quantities, cached by compile()
+        self._t2 = None
+        self._ntot = None
+        self._npeak = None
+
     def add_thrust(self, t, thrust):
         self.thrust.append(Thrust(float(t), float(thrust)))
-     
+        self.times = None
+
+    def compile(self):
+        """
+        lay the thrust curve out in contiguous arrays.  Segment i runs from
+        node i - 1 (or 0, 0 for the first) to node i.  The node times are also
+        kept rounded to the ms as get_thrust has always compared them that way.
+        """
+
+        self.times = array('d', (node.t for node in self.thrust))
+        self.thrusts = array('d', (node.thrust for node in self.thrust))
+        self._rtimes = [round(t, 3) for t in self.times]
+
+        # cum_impulse[i] is the impulse delivered by the time of node i
+        self.cum_impulse = array('d')
+        prev_t, prev_thrust, tot = 0.0, 0.0, 0.0
+        for t, thrust in self.thrust:
+            tot += (t - prev_t) * (prev_thrust + thrust) / 2
+            self.cum_impulse.append(tot)
+            prev_t, prev_thrust = t, thrust
+
+        self._seg = 0
+
+        self._t2 = self.times[-1] if self.times else None
+        self._ntot = tot
+        self._npeak = max(self.thrusts) if self.thrusts else None
+
+    def _segment(self, t):
+        """ index of the node ending the segment that holds t, None past the end """
+
+        if self.times is None:
+            self.compile()
+
+        rtimes = self._rtimes
+        rt = round(t, 3)
+
+        # the segment that answered last time usually answers again
+        i = self._seg
+        if not (i < len(rtimes) and rt <= rtimes[i] and (i == 0 or rtimes[i - 1] < rt)):
+            i = bisect_left(rtimes, rt)
+            if i == len(rtimes):
+                return None
+            self._seg = i
+
+        return i
+
     def get_thrust(self, t):
         """ get thrust with respect to t """
 
-        if t >= 0.0:
-            prev_t = 0.0
-            prev_thrust = 0.0
-            for node in self.thrust:
-                if round(t, 3) <= round(node.t, 3):
-                    factor = (t - prev_t) / (node.t - prev_t)
-                    return prev_thrust + factor * (node.thrust - prev_thrust)
+        if t < 0.0:
+            return 0.0
+
+        i = self._segment(t)
+        if i is None:
+            return 0.0
+
+        if i:
+            prev_t, prev_thrust = self.times[i - 1], self.thrusts[i - 1]
+        else:
+            prev_t, prev_thrust = 0.0, 0.0
+
+        # a node at t=0 (or two at the same time) is a step, not a segment
+        if self.times[i] == prev_t:
+            return self.thrusts[i]
+
+        factor = (t - prev_t) / (self.times[i] - prev_t)
+        return prev_thrust + factor * (self.thrusts[i] - prev_thrust)
+
+    def get_thrust_array(self, times):
+        """ get_thrust for a sequence of times, as a numpy array when numpy is around """
+
+        if np is None:
+            return [self.get_thrust(t) for t in times]
+
+        if self.times is None:
+            self.compile()
+
+        times = np.asarray(times, dtype=float)
+        node_t = np.concatenate(([0.0], self.times))
+        node_f = np.concatenate(([0.0], self.thrusts))
+
+        i = np.searchsorted(np.array(self._rtimes), np.round(times, 3), side='left')
+        inside = (times >= 0.0) & (i < len(self.times))
+        i = np.minimum(i, len(self.times) - 1)
+
+        prev_t, prev_f = node_t[i], node_f[i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = (times - prev_t) / (node_t[i + 1] - prev_t)
+        thrust = np.where(node_t[i + 1] == prev_t, node_f[i + 1], prev_f + factor * (node_f[i + 1] - prev_f))
+
+        return np.where(inside, thrust, 0.0)
+
+    def impulse(self, t):
+        """ impulse delivered from ignition to t, exact for the linear segments """
+
+        if t <= 0.0:
+            return 0.0
+
+        i = self._segment(t)
+        if i is None:
+            return self._ntot
+
+        if i:
+            prev_t, prev_thrust, prev_tot = self.times[i - 1], self.thrusts[i - 1], self.cum_impulse[i - 1]
+        else:
+            prev_t, prev_thrust, prev_tot = 0.0, 0.0, 0.0
 
-                prev_t, prev_thrust = node
+        if self.times[i] == prev_t:
+            return prev_tot
 
-        return 0.0
+        factor = (t - prev_t) / (self.times[i] - prev_t)
+        thrust = prev_thrust + factor * (self.thrusts[i] - prev_thrust)
+
+        return prev_tot + (t - prev_t) * (prev_thrust + thrust) / 2
 
     def t2(self):
-        return self.thrust[-1].t if self.thrust else None
+        if self.times is None:
+            self.compile()
+        return self._t2
         
     def ntot(self):
-        t1, f1, tot = 0, 0, 0
-        for t2, f2 in self.thrust:
-            tot += (t2 - t1) * (f1 + f2) / 2
-            t1, f1 = t2, f2
-
-        return tot
+        if self.times is None:
+            self.compile()
+        return self._ntot
         
     def npeak(self):
-        return max([p.thrust for p in self.thrust])
+        if self.times is None:
+            self.compile()
+        return self._npeak
     
     def navg(self):
         return self.ntot() / self.t2()
+
+    def scaled(self, factor):
+        """ a copy of the motor with the thrust, and so the total impulse, scaled by factor """
+
+        motor = Engine(self.mfg, self.code, self.m2, self.diam, self.dlen, self.wt, self.delay)
+        for t, thrust in self.thrust:
+            motor.add_thrust(t, thrust * factor)
+
+        return motor
         
         
 def parse_commandline():
@@ -89,6 +227,18 @@ def parse_commandline():
     args = parser.parse_args()
 
 
+def parse_header(line):
+    """ Engine from a motor header line """
+
+    code, diam, dlen, sdelay, m2, wt, mfg = line.strip().split()
+
+    delay = []
+    for v in sdelay.strip().split('-'):
+        delay.append(int(v))
+
+    return Engine(mfg, code, m2, diam, dlen, wt, delay)
+
+
 def load_engine(engine_file):
     eng_info = {}
     parsing_thrust = False
@@ -99,24 +249,18 @@ def load_engine(engine_file):
 
             if not parsing_thrust:
                 try:
-                    code, diam, dlen, sdelay, m2, wt, mfg = line.strip().split()
+                    motor = parse_header(line)
                 except ValueError as e:
                     print("\n*** Error - Bad line in %s\n%s\n*** [%s]" %
                           (engine_file, e, line))
                     sys.exit(0)
-               
-                delay = []
-                for v in sdelay.strip().split('-'):
-                    delay.append(int(v))
-                    
-                motor = Engine(mfg, code, m2, diam, dlen, wt, delay)
 
                 parsing_thrust = True
             else:
                 t, thrust = [float(v) for v in line.strip().split()]
                 motor.add_thrust(t, thrust)
                 if t > 0 and thrust == 0:
-                    eng_info[code] = motor
+                    eng_info[motor.code] = motor
                     motor = None
 
                     parsing_thrust = False
@@ -124,10 +268,139 @@ def load_engine(engine_file):
     return eng_info
 
 
-def find_motor(eng_file, mcode):
-    eng_info = load_engine(eng_file)
+def build_index(engine_file):
+    """ scan the engine file once for the byte offset of every motor header """
+
+    index = {}
+    parsing_thrust = False
+    offset = 0
+    with open(engine_file, 'rb') as fp:
+        for raw in fp:
+            line = raw.decode()
+            if not line.startswith(';'):
+                if not parsing_thrust:
+                    motor = parse_header(line)
+                    header = offset
+                    parsing_thrust = True
+                else:
+                    t, thrust = [float(v) for v in line.strip().split()]
+                    motor.add_thrust(t, thrust)
+                    if t > 0 and thrust == 0:
+                        index[motor.code] = IndexEntry(header, motor.diam, motor.dlen, motor.mfg, motor.ntot(),
+                                                       motor.wt, motor.m2, motor.npeak(), motor.t2())
+                        parsing_thrust = False
+
+            offset += len(raw)
+
+    return index
+
+
+_indexes = {}
+
+
+def load_index(engine_file):
+    """
+    the engine file index, kept in a sidecar file next to the engine file
+    and rebuilt whenever the engine file's mtime or size no longer match
+    """
+
+    st = os.stat(engine_file)
+    key = (os.path.realpath(engine_file), st.st_mtime_ns, st.st_size)
+    if key in _indexes:
+        return _indexes[key]
+
+    index = None
+    idx_file = engine_file + INDEX_EXT
+    try:
+        with open(idx_file) as fp:
+            saved = json.load(fp)
+        if saved['mtime'] == st.st_mtime_ns and saved['size'] == st.st_size:
+            index = {code: IndexEntry(*v) for code, v in saved['motors'].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    if index is None:
+        index = build_index(engine_file)
+        try:
+            with open(idx_file, 'w') as fp:
+                json.dump({'mtime': st.st_mtime_ns, 'size': st.st_size,
+                           'motors': {code: list(v) for code, v in index.items()}}, fp)
+        except OSError:
+            pass  # read-only, just don't keep it
+
+    _indexes[key] = index
+    return index
+
+
+def read_motor(engine_file, offset):
+    """ parse the one motor whose header is at offset """
+
+    with open(engine_file, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(offset)
+        motor = parse_header(mm.readline().decode())
+
+        while True:
+            line = mm.readline().decode()
+            if not line:
+                break
+            if line.startswith(';'):
+                continue
+
+            t, thrust = [float(v) for v in line.strip().split()]
+            motor.add_thrust(t, thrust)
+            if t > 0 and thrust == 0:
+                break
 
-    return eng_info[mcode.upper()]
+    return motor
+
+
+class EngineCatalog:
+    """
+    parsed motors shared by everything in the process, least recently used
+    dropped first.  Keyed by the resolved engine file path, its mtime and
+    the motor code, so editing the engine file retires its old motors.
+    """
+
+    def __init__(self, maxsize=CATALOG_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._motors = OrderedDict()
+
+    def __len__(self):
+        return len(self._motors)
+
+    def __str__(self):
+        return "engine catalog: %d motors, %d hits, %d misses" % (len(self), self.hits, self.misses)
+
+    def get(self, eng_file, mcode):
+        key = (os.path.realpath(eng_file), os.stat(eng_file).st_mtime_ns, mcode.upper())
+
+        motor = self._motors.get(key)
+        if motor is not None:
+            self.hits += 1
+            self._motors.move_to_end(key)
+            return motor
+
+        self.misses += 1
+        entry = load_index(eng_file)[key[2]]
+        motor = self._motors[key] = read_motor(eng_file, entry.offset)
+        if len(self._motors) > self.maxsize:
+            self._motors.popitem(last=False)
+
+        return motor
+
+    def clear(self):
+        self._motors.clear()
+        self.hits = self.misses = 0
+
+
+catalog = EngineCatalog()
+
+
+def find_motor(eng_file, mcode):
+    with instrument.phase('engine_load'):
+        return catalog.get(eng_file, mcode)
 
 
 def get_motor(eng_file, prompt="Motor code"):
@@ -0,0 +1,418 @@
+""" raspjit
+compiled Euler kernel for summary flights, used by rasp.calc when numba
+is installed and the flight asks for it (Flight.compiled)
+
+Loading numba and the cached kernel takes about half a second, the time
+of some fifteen flights in the Python loop, so rasp.calc does not pick
+the kernel on its own: a single LAUNCH would get slower.  The callers
+that know how many flights they have ask for it past rasp.JIT_AFTER of
+them: batch decks by their number of LAUNCHes (nc.batch_flite), SWEEP by
+its points, montecarlo, motorsel and the golden corpus.  The interactive
+rasp.py keeps the trace, which the kernel does not.
+
+The kernel is the loop of rasp.simulate_stream written over flat arrays:
+the thrust curves of the stages laid end to end, the AeroProfile of each
+stage, the drag model table and the atmosphere table of the site.  It
+does the same arithmetic in the same order, so the summary is the one
+the Python loop gives.
+
+The atmosphere table grows as the flight climbs.  When the kernel runs
+off the rows filled so far it returns with its whole state in an array,
+the table is grown and the kernel picks up where it left off.  Flights
+the kernel cannot fly (above the top of the table, below the pad) are
+left to the Python loop, as are flights that keep a trace.
+
+Set RASP_NOJIT in the environment to always use the Python loop.
+
+    python raspjit.py deck.ovi
+
+flies every LAUNCH of a deck both ways and reports the differences.
+"""
+
+import io
+import sys
+import math
+import time
+import argparse
+import contextlib
+
+import rasp
+import atmos
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+VERSION = '1.0'
+
+G = rasp.G
+
+# kernel state, one slot of a float array each
+T, ALT, VEL, PREV_VEL, MASS, THRUST, LAUNCHED, COAST_TIME = range(8)
+NUM, START_BURN, END_BURN, END_STAGE, ROCKET_WT, DRAG_CONSTANT, MACH1, DRAG_BIAS = range(8, 16)
+T_COFF, T_ROD, V_ROD, V_COFF, A_COFF, MAX_ACCEL, T_MAX_ACCEL, MIN_ACCEL = range(16, 24)
+T_MIN_ACCEL, MAX_VEL, T_MAX_VEL, A_MAX_VEL, MAX_ALT, T_MAX_ALT, EVENTS, ROW = range(24, 32)
+STATE_SIZE = 32
+
+# kernel status
+DONE, NEED_ROWS, FALLBACK = range(3)
+
+# event codes, in the words of simulate_stream
+START_BURN_EVENT, IGNITION_EVENT, END_BURN_EVENT = range(3)
+
+
+def _fly(s, ev_t, ev_code, ev_stage, dt, coast_base, rod,
+         rho, drho, mach, dmach, atm_inv_step,
+         flat, bias_inv_step, bias_table, bias_slopes, bias_lo, bias_hi,
+         st_rocket_wt, st_ntot, st_burn_mass, st_engnum, st_burn_time, st_stage_delay, st_drag_constant,
+         st_number, st_first, times, thrusts, rtimes, cum_impulse):
+    """ the Euler loop from state s until apogee, or until it needs atmosphere rows """
+
+    t, alt, vel, prev_vel = s[T], s[ALT], s[VEL], s[PREV_VEL]
+    mass, thrust, launched, coast_time = s[MASS], s[THRUST], s[LAUNCHED] != 0.0, s[COAST_TIME]
+    num = int(s[NUM])
+    start_burn, end_burn, end_stage = s[START_BURN], s[END_BURN], s[END_STAGE]
+    rocket_wt, drag_constant, mach1, drag_bias = s[ROCKET_WT], s[DRAG_CONSTANT], s[MACH1], s[DRAG_BIAS]
+    n_events = int(s[EVENTS])
+
+    last = len(st_rocket_wt) - 1
+    atm_rows = len(drho)
+    bias_rows = len(bias_slopes)
+    status = DONE
+
+    while True:
+        # atmosphere table, as AtmosTable.lookup
+        f = alt * atm_inv_step
+        i = int(f)
+        if alt < 0.0:
+            status = FALLBACK
+            break
+        if i >= atm_rows:
+            s[ROW] = i
+            status = NEED_ROWS
+            break
+        f -= i
+        r = rho[i] + f * drho[i]
+        mach1 = mach[i] + f * dmach[i]
+
+        c = r * drag_constant
+
+        t += dt
+
+        # handle staging, if needed
+        if t > end_stage and num < last:
+            num += 1
+            rocket_wt = st_rocket_wt[num]
+            start_burn = t
+            end_burn = start_burn + st_burn_time[num]
+            end_stage = end_burn + st_stage_delay[num]
+            ev_t[n_events], ev_code[n_events], ev_stage[n_events] = t, START_BURN_EVENT, st_number[num]
+            n_events += 1
+
+            drag_constant = st_drag_constant[num]
+            c = r * drag_constant
+            ev_t[n_events], ev_code[n_events], ev_stage[n_events] = t, IGNITION_EVENT, st_number[num]
+            n_events += 1
+
+        # Handle the powered phase of the boost, as Engine.get_thrust and Engine.impulse
+        if start_burn <= t <= end_burn:
+            tau = t - start_burn
+            lo, hi = st_first[num], st_first[num + 1]
+            j = lo + np.searchsorted(rtimes[lo:hi], round(tau, 3))
+            if j == hi:
+                engine_thrust = 0.0
+                impulse = st_ntot[num]
+            else:
+                if j > lo:
+                    prev_t, prev_thrust, prev_tot = times[j - 1], thrusts[j - 1], cum_impulse[j - 1]
+                else:
+                    prev_t, prev_thrust, prev_tot = 0.0, 0.0, 0.0
+                if times[j] == prev_t:
+                    engine_thrust = thrusts[j]
+                    impulse = prev_tot
+                else:
+                    factor = (tau - prev_t) / (times[j] - prev_t)
+                    engine_thrust = prev_thrust + factor * (thrusts[j] - prev_thrust)
+                    impulse = prev_tot + (tau - prev_t) * (prev_thrust + engine_thrust) / 2
+                if tau < 0.0:
+                    engine_thrust = 0.0
+                if tau <= 0.0:
+                    impulse = 0.0
+
+            thrust = engine_thrust * st_engnum[num]
+            m1 = impulse / st_ntot[num]
+            m1 *= st_burn_mass[num]
+            mass = rocket_wt - m1
+        elif thrust > 0.0:
+            thrust = 0.0
+            ev_t[n_events], ev_code[n_events], ev_stage[n_events] = t, END_BURN_EVENT, st_number[num]
+            n_events += 1
+
+            if s[T_COFF] == 0.0 and num == last:
+                s[T_COFF] = t
+
+        # average last two vel values
+        avg_vel = (prev_vel + vel) / 2
+
+        # drag divergence, as DragModel.bias
+        mach_number = vel / mach1
+        if mach_number <= flat:
+            drag_bias = 1.0
+        else:
+            fb = mach_number * bias_inv_step
+            k = int(fb)
+            if mach_number < 0.0:
+                drag_bias = bias_lo
+            elif k >= bias_rows:
+                drag_bias = bias_hi
+            else:
+                drag_bias = bias_table[k] + (fb - k) * bias_slopes[k]
+
+        cc = c * drag_bias
+        drag = - (cc * avg_vel * avg_vel)
+
+        if launched and vel <= 0:
+            drag = - drag
+            accel = (drag / mass) - G
+        else:
+            accel = ((thrust + drag) / mass) - G
+
+        prev_vel = vel
+        vel = vel + accel * dt
+        alt = alt + vel * dt
+
+        # test for lift-off and apogee
+        if vel > 0:
+            launched = True
+        elif not launched and vel < 0:
+            alt = vel = accel = 0.0
+        elif launched and vel < 0:
+            coast_time += dt
+            if alt <= 0.0 or coast_time > coast_base:
+                break
+
+        if t == s[T_COFF]:
+            s[V_COFF] = vel
+            s[A_COFF] = alt
+
+        if alt <= rod and vel > 0:
+            s[T_ROD] = t
+            s[V_ROD] = vel
+
+        # do max evaluations
+        if accel > s[MAX_ACCEL]:
+            s[MAX_ACCEL] = accel
+            s[T_MAX_ACCEL] = t
+        elif accel < s[MIN_ACCEL]:
+            s[MIN_ACCEL] = accel
+            s[T_MIN_ACCEL] = t
+
+        if vel > s[MAX_VEL]:
+            s[MAX_VEL] = vel
+            s[T_MAX_VEL] = t
+            s[A_MAX_VEL] = alt
+
+        if alt > s[MAX_ALT]:
+            s[MAX_ALT] = alt
+            s[T_MAX_ALT] = t
+
+        if not launched and num == last and t >= end_stage:
+            break  # never left the pad
+
+    s[T], s[ALT], s[VEL], s[PREV_VEL] = t, alt, vel, prev_vel
+    s[MASS], s[THRUST], s[LAUNCHED], s[COAST_TIME] = mass, thrust, 1.0 if launched else 0.0, coast_time
+    s[NUM], s[START_BURN], s[END_BURN], s[END_STAGE] = num, start_burn, end_burn, end_stage
+    s[ROCKET_WT], s[DRAG_CONSTANT], s[MACH1], s[DRAG_BIAS] = rocket_wt, drag_constant, mach1, drag_bias
+    s[EVENTS] = n_events
+
+    return status
+
+
+if numba is not None:
+    kernel = numba.njit(cache=True)(_fly)
+else:
+    kernel = _fly
+
+enabled = numba is not None and np is not None
+
+
+def compile_flight(flight):
+    """ the arrays the kernel flies, and the starting state, for a summary flight """
+
+    profiles = rasp.aero_profiles(flight)
+    model = profiles[0].drag_model
+
+    first = [0]
+    for aero in profiles:
+        first.append(first[-1] + len(aero.engine.thrust))
+
+    def column(get):
+        return np.array([get(aero) for aero in profiles], dtype=float)
+
+    def curves(get):
+        return np.concatenate([np.asarray(get(aero.engine), dtype=float) for aero in profiles])
+
+    for aero in profiles:
+        aero.engine.t2()  # compiles the thrust curve
+
+    stages = dict(
+        st_rocket_wt=column(lambda a: a.rocket_wt), st_ntot=column(lambda a: a.ntot),
+        st_burn_mass=column(lambda a: a.burn_mass), st_engnum=column(lambda a: a.engnum),
+        st_burn_time=column(lambda a: a.burn_time), st_stage_delay=column(lambda a: a.stage_delay),
+        st_drag_constant=column(lambda a: a.drag_constant),
+        st_number=np.array([a.stage.number for a in profiles], dtype=np.int64),
+        st_first=np.array(first, dtype=np.int64),
+        times=curves(lambda e: e.times), thrusts=curves(lambda e: e.thrusts),
+        rtimes=curves(lambda e: e._rtimes), cum_impulse=curves(lambda e: e.cum_impulse))
+
+    # the model is flat past both ends of its table, as all of diverge's are
+    drag = dict(flat=model.flat, bias_inv_step=model.inv_step,
+                bias_table=np.array(model.table), bias_slopes=np.array(model.slopes),
+                bias_lo=model.func(-model.step), bias_hi=model.func(model.rows * model.step))
+
+    aero = profiles[0]
+    s = np.zeros(STATE_SIZE)
+    s[ALT] = rasp.LAUNCHALT
+    s[MASS] = s[ROCKET_WT] = aero.rocket_wt
+    s[THRUST] = aero.engine.thrust[0].thrust
+    s[END_BURN] = aero.burn_time
+    s[END_STAGE] = aero.burn_time + aero.stage_delay
+    s[DRAG_CONSTANT] = aero.drag_constant
+
+    return s, stages, drag
+
+
+def calc(flight):
+    """ rasp.calc of a summary flight by the kernel, None if the kernel cannot fly it """
+
+    results = rasp.Summary(None, flight.print_t)
+
+    results.mach1_0 = math.sqrt(rasp.MACH_CONST * flight.base_temp)
+    results.baro_press = flight.baro_press
+    results.base_temp = flight.base_temp
+    results.site_alt = flight.site_alt
+    results.rod = flight.rod
+    results.rho_0 = (flight.baro_press * rasp.IN2PASCAL) / (rasp.GAS_CONST_AIR * flight.base_temp)
+    atm = atmos.table(flight.site_alt, flight.base_temp, results.rho_0, flight.temp_correction)
+
+    s, stages, drag = compile_flight(flight)
+    s[MACH1] = results.mach1_0
+    max_events = 3 * len(stages['st_number'])
+    ev_t, ev_code, ev_stage = np.zeros(max_events), np.zeros(max_events, dtype=np.int64), \
+        np.zeros(max_events, dtype=np.int64)
+
+    while True:
+        if not atm.rows:
+            atm._grow(0)
+        status = kernel(s, ev_t, ev_code, ev_stage, flight.dt, flight.coast_base, flight.rod,
+                        np.frombuffer(atm.rho), np.frombuffer(atm.drho),
+                        np.frombuffer(atm.mach), np.frombuffer(atm.dmach), atm.inv_step,
+                        **drag, **stages)
+        if status == DONE:
+            break
+        if status == FALLBACK or s[ROW] >= atm.top:
+            return None
+        atm._grow(int(s[ROW]))
+
+    for name, slot in (('t_coff', T_COFF), ('t_rod', T_ROD), ('v_rod', V_ROD), ('v_coff', V_COFF),
+                       ('a_coff', A_COFF), ('max_accel', MAX_ACCEL), ('t_max_accel', T_MAX_ACCEL),
+                       ('min_accel', MIN_ACCEL), ('t_min_accel', T_MIN_ACCEL), ('max_vel', MAX_VEL),
+                       ('t_max_vel', T_MAX_VEL), ('a_max_vel', A_MAX_VEL), ('max_alt', MAX_ALT),
+                       ('t_max_alt', T_MAX_ALT), ('mach1_0', MACH1), ('drag_bias', DRAG_BIAS)):
+        setattr(results, name, float(s[slot]))
+
+    for t, code, number in zip(ev_t[:int(s[EVENTS])], ev_code, ev_stage):
+        if code == START_BURN_EVENT:
+            results.add_event(float(t), f'start_burn stage {number}')
+        elif code == IGNITION_EVENT:
+            results.events.append((float(t), f"Stage {number} ignition"))
+        else:
+            results.add_event(float(t), f'end_burn stage {number}')
+
+    return results
+
+
+# summary fields compared by the parity check
+PARITY_FIELDS = ('t_rod', 'v_rod', 't_coff', 'v_coff', 'a_coff', 'max_accel', 't_max_accel', 'min_accel',
+                 't_min_accel', 'max_vel', 't_max_vel', 'a_max_vel', 'max_alt', 't_max_alt', 'mach1_0')
+
+
+def parity(flight):
+    """ (field, python, kernel) for every field that differs, and the two run times """
+
+    flight.record = 'summary'
+
+    t0 = time.perf_counter()
+    want = rasp.Summary(None, flight.print_t)
+    for _ in rasp.simulate_stream(flight, want):
+        pass
+    t1 = time.perf_counter()
+    got = calc(flight)
+    t2 = time.perf_counter()
+
+    if got is None:
+        return None, t1 - t0, t2 - t1
+
+    diffs = [(name, getattr(want, name), getattr(got, name))
+             for name in PARITY_FIELDS if getattr(want, name) != getattr(got, name)]
+    if want.events != got.events:
+        diffs.append(('events', want.events, got.events))
+
+    return diffs, t1 - t0, t2 - t1
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='raspjit', description=f'RASP kernel parity check (v{VERSION})')
+    parser.add_argument('-r', '--rtol', type=float, default=0.0, help="relative difference to accept")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+    parser.add_argument('raspfile', nargs='+', help="rasp batch files")
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    if np is None:
+        print("raspjit needs numpy")
+        return 1
+
+    print("%c kernel: %s" % (rasp.CH1, "numba " + numba.__version__ if numba else "interpreted (no numba)"))
+
+    import nc
+
+    failed = 0
+    for raspfile in args.raspfile:
+        flights = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            nc.batch_flite(raspfile, launch=lambda rkt: flights.append(rkt.as_flight()))
+
+        for num, flight in enumerate(flights, start=1):
+            diffs, t_python, t_kernel = parity(flight)
+            label = "%s #%d %s" % (raspfile, num, '/'.join(e.code for e in flight.e_info))
+
+            if diffs is None:
+                print("  %-40s  left to the Python loop" % label)
+                continue
+
+            bad = [d for d in diffs if d[0] == 'events' or
+                   abs(d[1] - d[2]) > args.rtol * max(abs(d[1]), abs(d[2]))]
+            print("  %-40s  python %8.1f ms  kernel %8.1f ms  %s" % (
+                  label, t_python * 1e3, t_kernel * 1e3, "ok" if not bad else "DIFFERS"))
+            for name, want, got in bad:
+                print("      %-12s %r  %r" % (name, want, got))
+            failed += bool(bad)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
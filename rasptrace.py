@@ -0,0 +1,224 @@
+""" rasptrace
+binary trace files: the full trace of a flight as columns of doubles (or
+floats) with the rocket, motors, site conditions, summary and events
+alongside, so plotting and comparison tools need not parse the text
+report
+
+    offset 0        MAGIC
+    offset 8        length of the header, little endian unsigned 64 bit
+    offset 16       the header, JSON padded with blanks to a multiple of 8 bytes
+    then            one column after the other, each rows items of typecode
+                    in byteorder, padded to a multiple of 8 bytes
+
+The header holds the column names, units and offsets (from the start of
+the columns), so a reader can map the file and touch only the columns it
+needs.  Trace.column() hands back a numpy array on the map when numpy is
+installed and a memoryview of it otherwise.
+
+    python rasptrace.py vul.f50.rtr                   header and column ranges
+    python rasptrace.py vul.f50.rtr -c t alt vel      columns as a gnuplot table
+"""
+
+import sys
+import json
+import mmap
+import struct
+import argparse
+from array import array
+
+import rasp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VERSION = '1.0'
+
+MAGIC = b'RASPTRC\x01'
+EXT = '.rtr'
+
+# column name, Results attribute, unit
+COLUMNS = (
+    ('t', 'tee', 's'),
+    ('alt', 'alt', 'm'),
+    ('vel', 'vel', 'm/s'),
+    ('acc', 'acc', 'm/s^2'),
+    ('mass', 'mass', 'kg'),
+    ('thrust', 'thrust', 'N'),
+    ('drag', 'drag', 'N'),
+)
+
+# Results scalars kept in the header
+SUMMARY = ('max_alt', 't_max_alt', 'max_vel', 't_max_vel', 't_rod', 't_coff',
+           'max_accel', 't_max_accel', 'min_accel', 't_min_accel')
+
+
+def _pad(n):
+    return -n % 8
+
+
+def metadata(flight, results):
+    """ the rocket, motors, site conditions, summary and events of a flight, in SI units """
+
+    rocket = flight.rocket
+    stages = [dict(number=stage.number, engnum=stage.engnum, weight=stage.weight, maxd=stage.maxd * rasp.IN2M,
+                   cd=stage.cd, stage_delay=stage.stage_delay, fins=stage.fins.num,
+                   fin_thickness=stage.fins.thickness * rasp.IN2M, fin_span=stage.fins.span * rasp.IN2M)
+              for stage in rocket.stages]
+    motors = [dict(code=e.code, mfg=e.mfg, diam=e.diam, dlen=e.dlen, prop_mass=e.m2, mass=e.wt,
+                   delays=list(e.delay), burn_time=e.t2(), impulse=e.ntot())
+              for e in flight.e_info]
+
+    summary = {name: getattr(results, name) for name in SUMMARY}
+    summary.update(v_rod=results.vrod(), v_coff=results.vcoff(), a_coff=results.acoff(),
+                   a_max_vel=results.amaxvel())
+
+    return dict(
+        rocket=dict(name=flight.rname, nose=rocket.nose, stages=stages),
+        motors=motors,
+        motor_file=flight.ename,
+        site=dict(alt=flight.site_alt, temp=flight.base_temp, press=flight.baro_press * rasp.IN2PASCAL,
+                  rod=flight.rod, rho_0=results.rho_0, mach1_0=results.mach1_0),
+        integrator=dict(method=flight.method, dt=flight.dt, record=flight.record, coast=flight.coast_base),
+        summary=summary,
+        events=[[t, desc] for t, desc in results.events],
+    )
+
+
+def write(fname, flight, results, typecode='d'):
+    """ the trace of results to fname, columns of doubles or, typecode 'f', floats """
+
+    rows = len(results.tee)
+    itemsize = array(typecode).itemsize
+
+    columns = []
+    offset = 0
+    for name, _, unit in COLUMNS:
+        columns.append(dict(name=name, unit=unit, offset=offset))
+        offset += rows * itemsize + _pad(rows * itemsize)
+
+    header = dict(version=VERSION, rows=rows, typecode=typecode, byteorder=sys.byteorder,
+                  dt=results.dt, print_t=results.print_t, columns=columns, **metadata(flight, results))
+    text = json.dumps(header).encode()
+    text += b' ' * _pad(len(text))
+
+    with open(fname, 'wb') as fp:
+        fp.write(MAGIC)
+        fp.write(struct.pack('<Q', len(text)))
+        fp.write(text)
+        for _, attr, _ in COLUMNS:
+            data = getattr(results, attr).data
+            if typecode != data.typecode:
+                data = array(typecode, data)
+            data.tofile(fp)
+            fp.write(b'\0' * _pad(rows * itemsize))
+
+
+class Trace:
+    """
+    a trace file mapped read only; the header is in meta (and rows, names),
+    the columns are read on demand with column() or trace[name]
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:8] != MAGIC:
+            self._map.close()
+            raise ValueError("not a RASP trace: " + fname)
+
+        size, = struct.unpack('<Q', self._map[8:16])
+        self.meta = json.loads(self._map[16:16 + size])
+        self.rows = self.meta['rows']
+        self.names = [c['name'] for c in self.meta['columns']]
+
+        self._base = 16 + size
+        self._columns = {c['name']: c for c in self.meta['columns']}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def column(self, name):
+        """ a column, on the map where possible: columns taken keep it mapped after close() """
+
+        col = self._columns[name]
+        typecode = self.meta['typecode']
+        start = self._base + col['offset']
+        native = self.meta['byteorder'] == sys.byteorder
+
+        if np is not None:
+            dtype = np.dtype(typecode).newbyteorder('<' if self.meta['byteorder'] == 'little' else '>')
+            return np.frombuffer(self._map, dtype=dtype, count=self.rows, offset=start)
+
+        itemsize = array(typecode).itemsize
+        view = memoryview(self._map)[start:start + self.rows * itemsize]
+        if native:
+            return view.cast(typecode)
+
+        data = array(typecode, view.tobytes())
+        data.byteswap()
+        return data
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a column is still in use, the map goes with the last of them
+
+
+def parse_commandline():
+    global args, parser
+
+    parser = argparse.ArgumentParser(prog='rasptrace', description=f'RASP binary trace files (v{VERSION})')
+    parser.add_argument('-c', '--columns', nargs='+', help="print these columns as a table")
+    parser.add_argument('--version', action='version', version=f'v{VERSION}')
+    parser.add_argument('tracefile', help="trace file")
+
+    args = parser.parse_args()
+
+
+def main():
+    parse_commandline()
+
+    with Trace(args.tracefile) as trace:
+        meta = trace.meta
+        if args.columns:
+            print("%c %s" % (rasp.CH1, ' '.join("%12s" % name for name in args.columns)))
+            columns = [trace[name] for name in args.columns]
+            for row in zip(*columns):
+                print("  %s" % ' '.join("%12.6g" % v for v in row))
+            del columns
+            return 0
+
+        print("%c %s  %s" % (rasp.CH1, meta['rocket']['name'], '/'.join(m['code'] for m in meta['motors'])))
+        print("%c site alt %.1f m, temp %.2f K, pressure %.0f Pa" % (
+              rasp.CH1, meta['site']['alt'], meta['site']['temp'], meta['site']['press']))
+        print("%c %d rows of %s, dt %s" % (rasp.CH1, trace.rows, meta['typecode'], meta['dt']))
+        for name, value in meta['summary'].items():
+            print("%c   %-12s %14.6g" % (rasp.CH1, name, value))
+        for t, desc in meta['events']:
+            print("%c   %8.3f %s" % (rasp.CH1, t, desc))
+
+        for col in meta['columns']:
+            data = trace[col['name']]
+            lo, hi = (min(data), max(data)) if trace.rows else (0.0, 0.0)
+            print("%c   %-8s %-6s %14.6g %14.6g" % (rasp.CH1, col['name'], col['unit'], lo, hi))
+            del data
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+""" raspvec
+vectorized batch integrator: fly many Flights at once in lockstep
+
+Every flight is a lane in a set of NumPy arrays.  All lanes share the clock
+and take exactly the same Euler steps as rasp.calc, so the summary numbers
+agree with the scalar path to within BATCH_RTOL.  The only differences
+come from the atmosphere, which each lane evaluates from the model while
+rasp.calc reads it from a table, and the drag bias (about 1e-9).  Lanes
+that reach the end of their flight are retired and the arrays compacted
+so the cost tracks the number of flights still in the air.
+
+This is not a general speed-up.  A step costs about the same whether it
+carries one lane or a hundred (some 0.4 ms, against 4 us for a step of
+the Python loop), so the batch runs as long as its longest flight and
+only wins when many flights of about the same length share the clock:
+a Monte Carlo chunk of one rocket beats the Python loop from about
+BATCH_MIN flights.  A catalog of mixed motors is slower than flying the
+flights one at a time (the 222 motors of test.ovi: 38 s against 11 s),
+as the long flights finish with only a few lanes left.  The compiled
+kernel (raspjit) beats both.
+
+Only the summary is kept, there is no trace.
+"""
+
+import math
+
+import rasp
+import atmos
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH_RTOL = 1e-6    # relative tolerance vs. rasp.calc for the summary fields
+BATCH_MIN = 150      # flights of one rocket below which the batch loses to the Python loop
+
+SUMMARY_FIELDS = ('t_rod', 'v_rod', 't_coff', 'v_coff', 'a_coff', 'max_accel', 't_max_accel', 'min_accel',
+                  't_min_accel', 'max_vel', 't_max_vel', 'a_max_vel', 'max_alt', 't_max_alt')
+
+
+class ThrustTable:
+    """
+    all of the thrust curves in one set of node arrays, engine number eng
+    owning nodes first[eng] to last[eng], the first of them at t=0.  Each
+    lane is looked up on its own stage time by a bisection over its
+    engine's nodes, so it gets the numbers Engine.get_thrust gives however
+    many engines share the table.  As there, the segment is found with the
+    times rounded to the ms.
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.xp = None
+        self.rxp = None    # node times rounded to the ms
+        self.fp = None
+        self.cp = None     # cumulative impulse at each node
+        self.first = None
+        self.last = None
+        self.depth = 0     # bisection steps that narrow any engine down to one node
+
+    def add(self, engine):
+        if id(engine) not in self.engines:
+            self.engines[id(engine)] = (len(self.engines), engine)
+
+    def index(self, engine):
+        return self.engines[id(engine)][0]
+
+    def build(self):
+        xp, fp, cp, first, last = [], [], [], [], []
+        for num, engine in sorted(self.engines.values(), key=lambda v: v[0]):
+            first.append(len(xp))
+            if engine.thrust[0].t > 0.0:
+                xp.append(0.0)
+                fp.append(0.0)
+                cp.append(0.0)
+            if engine.times is None:
+                engine.compile()
+            xp.extend(engine.times)
+            fp.extend(engine.thrusts)
+            cp.extend(engine.cum_impulse)
+            last.append(len(xp) - 1)
+
+        self.xp = np.array(xp)
+        self.rxp = np.round(self.xp, 3)
+        self.fp = np.array(fp)
+        self.cp = np.array(cp)
+        self.first = np.array(first)
+        self.last = np.array(last)
+        self.depth = int(np.max(self.last - self.first + 1)).bit_length()
+
+    def segment(self, eng, t):
+        """
+        for each lane the first node of engine eng at or after stage time t,
+        the node ending the segment that holds t; last[eng] + 1 past the end
+        """
+
+        rt = np.round(t, 3)
+        lo = self.first[eng]
+        hi = self.last[eng] + 1
+        top = len(self.xp) - 1
+        for _ in range(self.depth):
+            mid = (lo + hi) // 2
+            left = (lo < hi) & (self.rxp[np.minimum(mid, top)] < rt)
+            lo = np.where(left, mid + 1, lo)
+            hi = np.where(left | (lo >= hi), hi, mid)
+
+        return lo
+
+    def get_thrust(self, eng, t):
+        """ thrust of engine number eng at stage time t (arrays) """
+        return self.thrust_impulse(eng, t)[0]
+
+    def get_impulse(self, eng, t):
+        """ impulse of engine number eng delivered by stage time t """
+        return self.thrust_impulse(eng, t)[1]
+
+    def thrust_impulse(self, eng, t):
+        """ thrust of engine number eng at stage time t and the impulse delivered by then """
+
+        i = self.segment(eng, t)
+        last = self.last[eng]
+        inside = (t >= 0.0) & (i <= last)
+        end = np.minimum(i, last)
+        start = np.maximum(end - 1, self.first[eng])
+
+        prev_t, prev_f = self.xp[start], self.fp[start]
+        width = self.xp[end] - prev_t
+
+        # the first node (t=0) and a node repeated are steps, not segments
+        step = width == 0.0
+        factor = (t - prev_t) / np.where(step, 1.0, width)
+        thrust = np.where(step, self.fp[end], prev_f + factor * (self.fp[end] - prev_f))
+        impulse = np.where(step, self.cp[start], self.cp[start] + (t - prev_t) * (prev_f + thrust) / 2)
+
+        thrust = np.where(inside, thrust, 0.0)
+        impulse = np.where(inside, impulse, self.cp[last])
+        return thrust, np.where(t > 0.0, impulse, 0.0)
+
+
+def drag_diverge(models, lane_model, mach_1, velocity):
+    """ DragModel.bias for arrays of lanes, lane_model indexes models """
+
+    mach_number = velocity / mach_1
+    if len(models) == 1:
+        return models[0].factor_array(mach_number)
+
+    bias = np.ones_like(mach_number)
+    for i, model in enumerate(models):
+        mask = lane_model == i
+        bias[mask] = model.factor_array(mach_number[mask])
+
+    return bias
+
+
+def calc_batch(flights, dt=None):
+    """
+    fly every flight in flights and return a rasp.Summary for each, in order
+
+    All lanes share one time step, dt, which defaults to that of the first
+    flight.
+
+    Staging, burnout and apogee are handled per lane.  Lanes are masked
+    rather than branched on so each step is a fixed number of array ops.
+    """
+
+    if np is None:
+        raise ImportError("calc_batch requires numpy")
+
+    n = len(flights)
+    summaries = [rasp.Summary() for _ in flights]
+    if not n:
+        return summaries
+
+    if dt is None:
+        dt = flights[0].dt
+
+    table = ThrustTable()
+    for flight in flights:
+        for engine in flight.e_info:
+            table.add(engine)
+    table.build()
+
+    for flight, summary in zip(flights, summaries):
+        summary.mach1_0 = math.sqrt(rasp.MACH_CONST * flight.base_temp)
+        summary.baro_press = flight.baro_press
+        summary.base_temp = flight.base_temp
+        summary.site_alt = flight.site_alt
+        summary.rod = flight.rod
+        summary.rho_0 = (flight.baro_press * rasp.IN2PASCAL) / (rasp.GAS_CONST_AIR * flight.base_temp)
+
+    profiles = [rasp.aero_profiles(f) for f in flights]
+
+    # the distinct drag models, lanes hold an index into them
+    lane_models = [p[0].drag_model for p in profiles]
+    models = list(dict.fromkeys(lane_models))
+
+    # per lane constants
+    L = {}
+    L['lane'] = np.arange(n)
+    L['base_temp'] = np.array([f.base_temp for f in flights], dtype=float)
+    L['site_alt'] = np.array([f.site_alt for f in flights], dtype=float)
+    L['rho_0'] = np.array([s.rho_0 for s in summaries])
+    L['mach1_0'] = np.array([s.mach1_0 for s in summaries])
+    L['rod'] = np.array([f.rod for f in flights], dtype=float)
+    L['coast_base'] = np.array([f.coast_base for f in flights], dtype=float)
+    L['temp_correction'] = np.array([bool(f.temp_correction) for f in flights])
+    L['drag_model'] = np.array([models.index(m) for m in lane_models])
+    L['last_stage'] = np.array([len(f.rocket.stages) - 1 for f in flights])
+
+    # per lane stage state
+    L['stage_num'] = np.zeros(n, dtype=int)
+    L['eng'] = np.array([table.index(f.e_info[0]) for f in flights])
+    L['engnum'] = np.array([p[0].engnum for p in profiles], dtype=float)
+    L['ntot'] = np.array([p[0].ntot for p in profiles])
+    L['burn_mass'] = np.array([p[0].burn_mass for p in profiles], dtype=float)
+    L['rocket_wt'] = np.array([p[0].rocket_wt for p in profiles], dtype=float)
+    L['start_burn'] = np.zeros(n)
+    L['end_burn'] = np.array([p[0].burn_time for p in profiles])
+    L['end_stage'] = L['end_burn'] + np.array([p[0].stage_delay for p in profiles], dtype=float)
+    L['drag_constant'] = np.array([p[0].drag_constant for p in profiles])
+
+    # per lane flight state
+    L['alt'] = np.full(n, rasp.LAUNCHALT)
+    L['vel'] = np.zeros(n)
+    L['vel_prev'] = np.zeros(n)
+    L['mass'] = L['rocket_wt'].copy()
+    L['thrust'] = np.array([f.e_info[0].thrust[0].thrust for f in flights])
+    L['coast_time'] = np.zeros(n)
+    L['launched'] = np.zeros(n, dtype=bool)
+
+    # per lane summary
+    for k in SUMMARY_FIELDS:
+        L[k] = np.zeros(n)
+
+    def retire(done):
+        """ copy finished lanes out to their summaries and drop them """
+        for i in np.nonzero(done)[0]:
+            summary = summaries[L['lane'][i]]
+            for k in SUMMARY_FIELDS:
+                setattr(summary, k, float(L[k][i]))
+            if L['temp_correction'][i]:
+                summary.mach1_0 = float(L['mach1_0'][i])
+
+        keep = ~done
+        for k in L:
+            L[k] = L[k][keep]
+
+    t = 0.0
+    while len(L['lane']):
+        # Calculate decreasing air density
+        y = L['alt']
+        r = atmos.density_array(L['site_alt'], L['base_temp'], L['rho_0'], y)
+
+        if L['temp_correction'].any():
+            L['mach1_0'] = np.where(L['temp_correction'],
+                                    np.sqrt(rasp.MACH_CONST * atmos.temperature_array(L['site_alt'], L['base_temp'], y)), L['mach1_0'])
+
+        t += dt
+
+        # handle staging, if needed (rare, so done lane by lane)
+        staging = (t > L['end_stage']) & (L['stage_num'] < L['last_stage'])
+        for i in np.nonzero(staging)[0]:
+            num = L['stage_num'][i] + 1
+            aero = profiles[L['lane'][i]][num]
+
+            L['stage_num'][i] = num
+            L['rocket_wt'][i] = aero.rocket_wt
+            L['eng'][i] = table.index(aero.engine)
+            L['engnum'][i] = aero.engnum
+            L['ntot'][i] = aero.ntot
+            L['burn_mass'][i] = aero.burn_mass
+            L['start_burn'][i] = t
+            L['end_burn'][i] = t + aero.burn_time
+            L['end_stage'][i] = L['end_burn'][i] + aero.stage_delay
+            L['drag_constant'][i] = aero.drag_constant
+
+            summary = summaries[L['lane'][i]]
+            summary.add_event(t, f'start_burn stage {aero.stage.number}')
+            summary.add_event(t, f"Stage {aero.stage.number} ignition")
+
+        c = r * L['drag_constant']
+
+        # Handle the powered phase of the boost
+        powered = (L['start_burn'] <= t) & (t <= L['end_burn'])
+        burning = np.nonzero(powered)[0]
+        if len(burning):
+            eng = L['eng'][burning]
+            engine_thrust, impulse = table.thrust_impulse(eng, t - L['start_burn'][burning])
+            m1 = impulse / L['ntot'][burning] * L['burn_mass'][burning]
+            L['mass'][burning] = L['rocket_wt'][burning] - m1
+
+        cutoff = ~powered & (L['thrust'] > 0.0)
+        L['thrust'][cutoff] = 0.0
+        if len(burning):
+            L['thrust'][burning] = engine_thrust * L['engnum'][burning]
+        coff = cutoff & (L['t_coff'] == 0.0) & (L['stage_num'] == L['last_stage'])
+        for i in np.nonzero(cutoff)[0]:
+            summaries[L['lane'][i]].add_event(t, f"end_burn stage {L['stage_num'][i] + 1}")
+        L['t_coff'] = np.where(coff, t, L['t_coff'])
+
+        # average last two vel values
+        avg_vel = (L['vel_prev'] + L['vel']) / 2
+
+        drag_bias = drag_diverge(models, L['drag_model'], L['mach1_0'], L['vel'])
+        cc = c * drag_bias
+        drag = - (cc * avg_vel * avg_vel)
+
+        falling = L['launched'] & (L['vel'] <= 0)
+        drag = np.where(falling, -drag, drag)
+        accel = np.where(falling, drag, L['thrust'] + drag) / L['mass'] - rasp.G
+
+        vel = L['vel'] + accel * dt
+        alt = L['alt'] + vel * dt
+
+        # test for lift-off and apogee
+        lift = vel > 0
+        on_pad = ~L['launched'] & (vel < 0)
+        descent = L['launched'] & ~lift & (vel < 0)
+        L['launched'] = L['launched'] | lift
+        alt = np.where(on_pad, 0.0, alt)
+        vel = np.where(on_pad, 0.0, vel)
+        accel = np.where(on_pad, 0.0, accel)
+        L['coast_time'] = np.where(descent, L['coast_time'] + dt, L['coast_time'])
+        done = descent & ((alt <= 0.0) | (L['coast_time'] > L['coast_base']))
+        done |= on_pad & (L['stage_num'] == L['last_stage']) & (t >= L['end_stage'])  # never left the pad
+
+        # done lanes break before their sample is recorded
+        live = ~done
+        L['vel_prev'] = np.where(live, L['vel'], L['vel_prev'])
+        L['vel'] = np.where(live, vel, L['vel'])
+        L['alt'] = np.where(live, alt, L['alt'])
+
+        L['v_coff'] = np.where(coff & live, vel, L['v_coff'])
+        L['a_coff'] = np.where(coff & live, alt, L['a_coff'])
+
+        on_rod = live & (alt <= L['rod']) & (vel > 0)
+        L['t_rod'] = np.where(on_rod, t, L['t_rod'])
+        L['v_rod'] = np.where(on_rod, vel, L['v_rod'])
+
+        # do max evaluations
+        hi = live & (accel > L['max_accel'])
+        lo = live & ~hi & (accel < L['min_accel'])
+        L['max_accel'] = np.where(hi, accel, L['max_accel'])
+        L['t_max_accel'] = np.where(hi, t, L['t_max_accel'])
+        L['min_accel'] = np.where(lo, accel, L['min_accel'])
+        L['t_min_accel'] = np.where(lo, t, L['t_min_accel'])
+
+        hi = live & (vel > L['max_vel'])
+        L['max_vel'] = np.where(hi, vel, L['max_vel'])
+        L['t_max_vel'] = np.where(hi, t, L['t_max_vel'])
+        L['a_max_vel'] = np.where(hi, alt, L['a_max_vel'])
+
+        hi = live & (alt > L['max_alt'])
+        L['max_alt'] = np.where(hi, alt, L['max_alt'])
+        L['t_max_alt'] = np.where(hi, t, L['t_max_alt'])
+
+        if done.any():
+            retire(done)
+
+    return summaries
+
+
+def compare(flights, fields=('max_alt', 't_max_alt', 'max_vel', 't_max_vel', 't_coff', 't_rod')):
+    """ fly flights both ways and return the worst relative difference per field """
+
+    worst = dict.fromkeys(fields, 0.0)
+    for flight, summary in zip(flights, calc_batch(flights)):
+        results = rasp.calc(flight)
+        for k in fields:
+            a, b = getattr(results, k), getattr(summary, k)
+            if a or b:
+                worst[k] = max(worst[k], abs(a - b) / max(abs(a), abs(b)))
+
+    return worst
@@ -0,0 +1,65 @@
+import pytest
+
+import atmos
+import rasp
+
+# the 1976 US standard atmosphere: layer base (geopotential km), temperature (K), pressure (Pa)
+STANDARD = (
+    (0, 288.15, 101325.0),
+    (11, 216.65, 22632.06),
+    (20, 216.65, 5474.889),
+    (32, 228.65, 868.0187),
+    (47, 270.65, 110.9063),
+    (51, 270.65, 66.93887),
+    (71, 214.65, 3.956420),
+)
+
+
+def geometric(h):
+    """ geometric altitude of geopotential altitude h """
+    return atmos.EARTH_R * h / (atmos.EARTH_R - h)
+
+
+@pytest.mark.parametrize('km, temp, press', STANDARD)
+def test_layer_boundaries(km, temp, press):
+    z = geometric(km * 1000.0)
+    assert atmos.geopotential(z) == pytest.approx(km * 1000.0, abs=1e-6)
+    for dz in (-0.01, 0.0, 0.01):
+        assert atmos.temperature(z + dz) == pytest.approx(temp, abs=1e-3)
+    assert atmos.pressure(z) == pytest.approx(press, rel=1e-5)
+
+
+def test_sea_level():
+    assert atmos.density(0.0) == pytest.approx(1.225, abs=1e-4)
+    assert atmos.standard_press(0.0) == pytest.approx(rasp.STD_ATM, abs=0.01)
+
+
+def test_arrays_match_floats():
+    np = pytest.importorskip('numpy')
+    z = np.linspace(-500.0, 90000.0, 997)
+    assert atmos.temperature(z) == pytest.approx([atmos.temperature(x) for x in z], rel=1e-14)
+    assert atmos.pressure(z) == pytest.approx([atmos.pressure(x) for x in z], rel=1e-12)
+
+
+@pytest.mark.parametrize('temp_correction', [False, True])
+def test_table_follows_the_model(temp_correction):
+    site_alt, base_temp = 1400.0, 300.0
+    rho_0 = 1.0
+    atm = atmos.AtmosTable(atmos.Site(site_alt, base_temp, rho_0), temp_correction)
+
+    assert atm.lookup(0.0) == (rho_0, atmos.sound_speed(base_temp))
+    for y in [0.37 + 97.3 * i for i in range(400)] + [30000.0, atm.top * atm.step + 50.0]:
+        rho, mach = atm.lookup(y)
+        want_rho, want_mach = atm.exact(y)
+        assert rho == pytest.approx(want_rho, rel=1e-8), y
+        assert mach == pytest.approx(want_mach, rel=1e-9), y
+
+
+def test_site_is_the_standard_atmosphere_shifted():
+    site = atmos.Site(1000.0, atmos.temperature(1000.0) + 10.0, 1.1)
+    assert site.temperature(0.0) == pytest.approx(site.base_temp)
+    assert site.density(0.0) == pytest.approx(1.1)
+    # the tropopause stays where it is above sea level
+    tropo = geometric(11000.0) - 1000.0
+    assert site.temperature(tropo) == pytest.approx(216.65 + 10.0, abs=1e-3)
+    assert site.temperature(tropo + 500.0) == pytest.approx(216.65 + 10.0, abs=1e-3)
@@ -0,0 +1,14 @@
+import bench
+
+
+def test_two_stage_runs_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = bench.run_all(repeat=1, names={'calc_two_stage'})
+    assert list(results) == ['calc_two_stage']
+    assert results['calc_two_stage']['rate'] > 0
+
+
+def test_regressions_threshold():
+    base = {'a': dict(rate=100.0, peak_kb=10.0), 'b': dict(rate=100.0, peak_kb=10.0)}
+    now = {'a': dict(rate=70.0, peak_kb=10.0), 'b': dict(rate=40.0, peak_kb=10.0), 'c': dict(rate=1.0, peak_kb=1.0)}
+    assert [w[:2] for w in bench.regressions(now, base, 0.5)] == [('b', 'rate')]
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+import diverge
+
+
+def test_read_curve_is_relative_to_the_lowest_mach(tmp_path):
+    fname = tmp_path / 'curve.csv'
+    fname.write_text("mach,cd\n1.0,0.8\n0.0,0.4\n0.5,0.4\n")
+    model = diverge.read_curve(str(fname))
+    assert model.bias(1.0, 0.0) == pytest.approx(1.0)
+    assert model.bias(1.0, 1.0) == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize('text, match', [
+    ("mach,cd\n", "no mach, cd rows"),
+    ("0.0,0.0\n1.0,0.5\n", "not positive"),
+    ("0.0,-0.3\n1.0,0.5\n", "not positive"),
+])
+def test_read_curve_rejects(tmp_path, text, match):
+    fname = tmp_path / 'bad.csv'
+    fname.write_text(text)
+    with pytest.raises(ValueError, match=match) as err:
+        diverge.read_curve(str(fname))
+    assert str(fname) in str(err.value)
+
+
+# the round nose curve rises as (M - 0.9) ** 1.1, so its first row bends the most
+@pytest.mark.parametrize('nose, func, chord', [('ogive', diverge.sharp, 1e-5), ('conic', diverge.sharp, 1e-5),
+                                               ('elliptic', diverge.rounded, 1e-4), ('blunt', diverge.rounded, 1e-4)])
+def test_built_in_tables_follow_their_curves(nose, func, chord):
+    model = diverge.for_nose(nose)
+    assert model.func is func
+
+    step = diverge.MACH_STEP
+    for i in range(model.rows):
+        # each row starts just above its grid point, as the table was filled
+        m = math.nextafter(i * step, math.inf)
+        assert model.bias(1.0, m) == pytest.approx(func(m), rel=1e-12, abs=1e-12), m
+        # and in between the curve is close to its chord
+        m = (i + 0.5) * step
+        assert model.bias(1.0, m) == pytest.approx(func(m), abs=chord), m
+
+    for m in (-0.5, 0.0, 0.9, diverge.MACH_TOP, 2.5, 10.0):
+        assert model.bias(1.0, m) == pytest.approx(func(m), abs=1e-12), m
+
+
+def test_factor_array_matches_bias():
+    np = pytest.importorskip('numpy')
+    machs = np.linspace(-0.2, 2.4, 2601)
+    for nose in ('ogive', 'elliptic'):
+        model = diverge.for_nose(nose)
+        assert list(model.factor_array(machs)) == pytest.approx([model.bias(1.0, m) for m in machs], abs=1e-15)
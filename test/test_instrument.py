@@ -0,0 +1,69 @@
+import pytest
+
+import instrument
+import nc
+import test_nc
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(instrument.time, 'perf_counter', clock)
+    yield clock
+    instrument.profile = None
+
+
+def test_nested_phases_are_exclusive(clock):
+    instrument.start()
+    with instrument.launch('deck') as rec:
+        clock.now += 1.0
+        with instrument.phase('flight_setup'):
+            clock.now += 2.0
+            with instrument.phase('engine_load'):
+                clock.now += 3.0
+            clock.now += 4.0
+        clock.now += 5.0
+    report = instrument.stop()
+
+    phases = rec['phases']
+    assert phases['engine_load'] == dict(seconds=3.0, calls=1)
+    assert phases['flight_setup'] == dict(seconds=6.0, calls=1)
+    assert rec['seconds'] == 15.0 and rec['other'] == 6.0
+    assert report['phases'] == phases and report['seconds'] == 15.0
+
+
+def test_off_costs_nothing():
+    assert not instrument.active()
+    assert instrument.phase('flight') is instrument.phase('output')
+    with instrument.launch('deck') as rec:
+        assert rec is None
+
+
+def test_launch_phases_add_up_to_no_more_than_its_time(tmp_path, monkeypatch):
+    fname = test_nc.deck(tmp_path, "MotorName F50\nOutFile a\nLaunch\nMotorName G40\nOutFile b\nLaunch\n")
+    monkeypatch.chdir(tmp_path)
+
+    instrument.start()
+    try:
+        nc.batch_flite(fname)
+    finally:
+        report = instrument.stop()
+
+    assert [rec['motor'] for rec in report['launches']] == ['F50', 'G40']
+    for rec in report['launches']:
+        inside = sum(p['seconds'] for p in rec['phases'].values())
+        assert all(p['seconds'] >= 0.0 for p in rec['phases'].values())
+        assert inside <= rec['seconds'] + 1e-9
+        assert rec['other'] == pytest.approx(rec['seconds'] - inside, abs=1e-9)
+        assert {'flight_setup', 'powered', 'coast', 'output'} <= set(rec['phases'])
+        assert rec['phases']['powered']['steps'] + rec['phases']['coast']['steps'] > 1000
+
+    assert sum(p['seconds'] for p in report['phases'].values()) <= report['seconds']
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import golden
+import montecarlo as mc
+
+
+def values(seed=1, count=5000):
+    rng = random.Random(seed)
+    return [rng.gauss(100.0, 15.0) for _ in range(count)]
+
+
+def test_welford_matches_numpy():
+    np = pytest.importorskip('numpy')
+    xs = values()
+    w = mc.Welford()
+    for x in xs:
+        w.add(x)
+
+    assert w.count == len(xs)
+    assert w.mean == pytest.approx(np.mean(xs), rel=1e-12)
+    assert w.std() == pytest.approx(np.std(xs, ddof=1), rel=1e-10)
+    assert (w.min, w.max) == (min(xs), max(xs))
+
+
+@pytest.mark.parametrize('p', mc.QUANTILES)
+def test_p2_quantile_tracks_numpy(p):
+    np = pytest.importorskip('numpy')
+    xs = values()
+    q = mc.P2Quantile(p)
+    for x in xs:
+        q.add(x)
+    assert q.value() == pytest.approx(np.quantile(xs, p), abs=0.02 * 15.0)
+
+
+def test_p2_quantile_of_a_few_values():
+    q = mc.P2Quantile(0.5)
+    assert q.value() != q.value()  # nan
+    for x in (3.0, 1.0, 2.0):
+        q.add(x)
+    assert q.value() == 2.0
+
+
+def report(stats):
+    return [(st.moments.count, st.moments.mean, st.moments.m2, [q.value() for q in st.quantiles], st.bins)
+            for st in stats]
+
+
+def test_seeded_runs_are_reproducible():
+    flight = golden.flight_for('test.ovi', 'F50')
+    kw = dict(count=24, chunk=5, cd=mc.Dist('normal:0.05'), mass=mc.Dist('uniform:0.02'),
+              temp=mc.Dist('normal:5'), impulse=mc.Dist('normal:0.03'))
+
+    first = report(mc.run(flight, seed=7, **kw))
+    assert first[0][0] == 24
+    assert report(mc.run(flight, seed=7, **kw)) == first
+    assert report(mc.run(flight, seed=7, jobs=2, **kw)) == first
+    assert report(mc.run(flight, seed=8, **kw)) != first
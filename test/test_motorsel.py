@@ -0,0 +1,42 @@
+import golden
+import motorsel
+import raspinfo
+
+
+def test_rod_bound_counts_the_burn_not_the_launch_mass():
+    # heavier than the peak thrust at launch, lighter once the propellant is gone
+    assert motorsel.rod_bound(peak_thrust=12.0, dry_mass=1.0, rod=1.5) > 0.0
+    assert motorsel.rod_bound(peak_thrust=9.0, dry_mass=1.0, rod=1.5) == 0.0
+
+
+def test_prune_keeps_every_motor_that_flies():
+    rkt = golden.reference('test.ovi')
+    keep, dropped = motorsel.prune(rkt, 0, golden.ENG_FILE)
+    assert set(dropped) <= {"no liftoff"}
+
+    for code in sorted(set(raspinfo.load_index(golden.ENG_FILE)) - set(keep)):
+        assert motorsel.fly_motor((rkt, 0, code, False)).max_alt == 0.0, code
+
+
+def test_prune_reads_the_index_not_the_motors(monkeypatch):
+    rkt = golden.reference('test.ovi')
+    raspinfo.catalog.clear()
+    parsed = []
+    read_motor = raspinfo.read_motor
+    monkeypatch.setattr(raspinfo, 'read_motor', lambda *a: parsed.append(a) or read_motor(*a))
+
+    keep, dropped = motorsel.prune(rkt, 0, golden.ENG_FILE, apogee_low=300.0, min_rod_vel=10.0)
+    assert keep and dropped
+    assert len(parsed) <= 1
+
+
+def test_prune_by_diameter_and_length():
+    rkt = golden.reference('test.ovi')
+    index = raspinfo.load_index(golden.ENG_FILE)
+
+    keep, dropped = motorsel.prune(rkt, 0, golden.ENG_FILE, diam=29, max_len=124)
+    assert keep and all(index[c].diam == 29 and index[c].dlen <= 124 for c in keep)
+    assert dropped["diameter"] and dropped["length"]
+
+    # 0 is no limit, as None is
+    assert motorsel.prune(rkt, 0, golden.ENG_FILE, diam=0, max_len=0) == motorsel.prune(rkt, 0, golden.ENG_FILE)
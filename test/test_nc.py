@@ -0,0 +1,154 @@
+import io
+import os
+import re
+import csv
+import copy
+
+import pytest
+
+import golden
+import nc
+import rasp
+
+
+def rocket(airframe='test.ovi', **kw):
+    rkt = copy.deepcopy(golden.reference(airframe))
+    for k, v in kw.items():
+        setattr(rkt, k, v)
+    return rkt
+
+
+def deck(tmp_path, tail, coast=0):
+    """ the test.ovi airframe, coasting coast seconds, followed by tail """
+
+    with open(os.path.join(golden.TEST_DIR, 'test.ovi')) as fp:
+        text = fp.read()
+    text = text[:text.index('MotorName')]
+    text = text.replace('../rasp.eng', golden.ENG_FILE)
+    text = re.sub(r'CoastTime\s+\S+', 'CoastTime %g' % coast, text)
+
+    fname = tmp_path / 'deck.ovi'
+    fname.write_text(text + tail)
+    return str(fname)
+
+
+def test_ejection_reaches_delays_after_apogee():
+    flight = rocket(coasttime=0, ejection=1, record='summary').as_flight()
+    assert flight.record == 'full'
+    results = rasp.calc(flight)
+
+    burnout, ideal, delays = rasp.ejection(flight, results)
+    assert [d for d, _, _, _ in delays] == [4, 6, 9]
+    assert delays[-1][1] > results.t_max_alt
+    for delay, t, alt, vel in delays:
+        assert alt is not None and vel is not None, delay
+    assert delays[-1][3] < 0.0
+
+    fp = io.StringIO()
+    rasp.print_ejection(fp, flight, results)
+    assert ' - ' not in fp.getvalue()
+
+
+def test_coast_is_kept_without_ejection():
+    assert rocket(coasttime=0).as_flight().coast_base == 0
+
+
+def test_sweep_flies_every_point(tmp_path, monkeypatch, capsys):
+    fname = deck(tmp_path, "MotorName F50\nSweep cd 0.6 0.5 -0.05\nSweep motorname F50 G40\n"
+                           "OutFile swept\nLaunch\n")
+    monkeypatch.chdir(tmp_path)
+    nc.batch_flite(fname)
+    assert "Sweeping ( 6 points ) into swept.csv" in capsys.readouterr().out
+
+    with open(tmp_path / 'swept.csv', newline='') as fp:
+        rows = list(csv.DictReader(fp))
+    assert [(r['cd'], r['motorname'], r['motor']) for r in rows] == [
+        (cd, m, m) for cd in ('0.6', '0.55', '0.5') for m in ('F50', 'G40')]
+
+    # less drag, higher apogee
+    for motor in ('F50', 'G40'):
+        alts = [float(r['max_alt (m)']) for r in rows if r['motor'] == motor]
+        assert alts == sorted(alts)
+
+
+@pytest.mark.parametrize('args, message', [
+    ("sweep cd 0.5 0.6 0", "bad sweep step:"),
+    ("sweep cd 0.6 0.5 0.05", "bad sweep step:"),
+    ("sweep cd 0.5 0.6 -0.05", "bad sweep step:"),
+    ("sweep cd 0.5 high 0.05", "bad sweep:"),
+    ("sweep cd 0.5 0.6", "short sweep:"),
+    ("sweep motorname", "short sweep:"),
+    ("sweep units MKS FPS", "can't sweep:"),
+])
+def test_bad_sweep_is_reported(args, message, capsys):
+    rasp_bat = nc.RocketBat()
+    nc.add_sweep(rasp_bat, rasp_bat.stages[0], args.split())
+    assert rasp_bat.sweeps == []
+    assert capsys.readouterr().out.startswith(message)
+
+
+def solve(rkt, stage, line):
+    nc.solve_flite(rkt, rkt.stages[stage], line.split())
+
+
+def test_solve_converges_on_finalalt(capsys):
+    rkt = rocket(finalalt=120.0)
+    solve(rkt, 0, "solve drymass 0.5 3 kg")
+    assert "gives 393.7 ft" in capsys.readouterr().out
+
+    flight = rkt.as_flight()
+    assert rasp.apogee(flight) == pytest.approx(120.0, abs=nc.SOLVE_FTOL)
+
+
+def test_solve_cd_of_the_upper_stage():
+    rkt = rocket('golden2.ovi', finalalt=500.0)
+    solve(rkt, 1, "solve cd")
+    assert rkt.stages[1].cd != 0.5
+    assert rasp.apogee(rkt.as_flight()) == pytest.approx(500.0, abs=nc.SOLVE_FTOL)
+
+
+@pytest.mark.parametrize('line, message', [
+    ("solve drymass 0.5 0.6 kg", "  393.7 ft is not between 0.5 and 0.6 kg"),
+    ("solve drymass 1 1 kg", "bad solve bracket:"),
+    ("solve drymass light 3 kg", "bad solve:"),
+    ("solve drymass 1", "short solve:"),
+    ("solve numfins 2 5", "can't solve for:"),
+])
+def test_solve_reports_what_it_cannot_do(line, message, capsys):
+    rkt = rocket(finalalt=120.0)
+    solve(rkt, 0, line)
+    assert message in capsys.readouterr().out
+    assert rkt.stages[0].drymass == golden.reference('test.ovi').stages[0].drymass
+
+
+def test_solve_refuses_a_cd_that_is_not_flown(capsys):
+    rkt = rocket('golden2.ovi', finalalt=500.0)
+    rkt.stages[1].cd = 0.7
+    solve(rkt, 0, "solve cd")
+    assert capsys.readouterr().out.startswith("can't solve for the cd of stage 1: stage 2 has a larger cd (0.7)")
+    assert rkt.stages[0].cd == 0.6
+
+
+@pytest.mark.parametrize('launches', [2, rasp.JIT_AFTER + 1])
+def test_decks_of_many_launches_ask_for_the_kernel(tmp_path, launches):
+    fname = deck(tmp_path, "MotorName F50\n" + "Launch\n" * launches)
+    flown = []
+    nc.batch_flite(fname, launch=lambda rkt: flown.append(rkt.as_flight().compiled))
+    assert flown == [launches > rasp.JIT_AFTER] * launches
+
+
+def test_jobs_write_the_same_reports_as_a_serial_run(tmp_path, monkeypatch):
+    tail = "".join("MotorName %s\nOutFile out.%s\nLaunch\n" % (m, m) for m in ('D12', 'F50', 'G40'))
+    fname = deck(tmp_path, tail)
+
+    reports = {}
+    for name, run in (('serial', lambda: nc.batch_flite(fname)),
+                      ('jobs', lambda: nc.batch_parallel([fname], 2))):
+        work = tmp_path / name
+        work.mkdir()
+        monkeypatch.chdir(work)
+        run()
+        reports[name] = {p.name: p.read_text() for p in sorted(work.iterdir())}
+
+    assert sorted(reports['serial']) == ['out.D12.txt', 'out.F50.txt', 'out.G40.txt']
+    assert reports['jobs'] == reports['serial']
@@ -0,0 +1,134 @@
+import io
+
+import pytest
+
+import golden
+import rasp
+
+
+def flight(motor='F50', airframe='test.ovi', **kw):
+    f = golden.flight_for(airframe, motor)
+    for k, v in kw.items():
+        setattr(f, k, v)
+    return f
+
+
+def test_convergence_euler_halves_dt():
+    alt, half_alt = rasp.convergence(flight())
+    assert alt != half_alt
+    assert half_alt == pytest.approx(alt, rel=1e-3)
+
+
+def test_convergence_rk45_tightens_tolerances(monkeypatch):
+    calls = []
+    adaptive = rasp.calc_adaptive
+
+    def spy(f, rtol=rasp.RK_RTOL, atol=rasp.RK_ATOL):
+        calls.append((f.dt, rtol, atol))
+        return adaptive(f, rtol, atol)
+
+    monkeypatch.setattr(rasp, 'calc_adaptive', spy)
+    f = flight(method='rk45')
+    alt, half_alt = rasp.convergence(f)
+
+    assert calls[-1] == (f.dt, rasp.RK_RTOL / 2, rasp.RK_ATOL / 2)
+    assert half_alt == pytest.approx(alt, rel=1e-6)
+
+    fp = io.StringIO()
+    rasp.print_convergence(fp, f)
+    assert 'tol/2' in fp.getvalue() and 'dt/2' not in fp.getvalue()
+
+
+@pytest.mark.parametrize('airframe, motor', [
+    ('test.ovi', 'F50'),
+    ('test.ovi', 'G40'),
+    ('golden2.ovi', 'D12'),
+    ('golden3.ovi', 'C6'),
+])
+def test_rk45_agrees_with_euler(airframe, motor):
+    euler = rasp.calc(flight(motor, airframe))
+    rk45 = rasp.calc(flight(motor, airframe, method='rk45'))
+    assert rk45.max_alt == pytest.approx(euler.max_alt, rel=1e-3)
+    assert rk45.t_max_alt == pytest.approx(euler.t_max_alt, abs=0.01)
+    assert rk45.max_vel == pytest.approx(euler.max_vel, rel=1e-3)
+
+
+def test_rk45_steps_land_on_burnout_and_staging():
+    f = flight('C6', 'golden3.ovi', method='rk45')
+    results = rasp.calc(f)
+
+    burnouts = [t for t, desc in results.events if desc.startswith('end_burn')]
+    ignitions = [t for t, desc in results.events if desc.startswith('start_burn')]
+    burn = [e.t2() for e in f.e_info]
+    assert burnouts == pytest.approx([burn[0], burn[0] + burn[1], sum(burn)], abs=1e-12)
+    assert ignitions == burnouts[:2]
+    assert results.t_coff == burnouts[-1]
+
+    assert results.dt is None
+    tee = list(results.tee)
+    assert tee[0] == 0.0 and all(a < b for a, b in zip(tee, tee[1:]))
+    assert tee[-1] == pytest.approx(results.t_max_alt, abs=1e-9)
+
+
+@pytest.mark.parametrize('method', ['euler', 'rk45'])
+def test_flight_that_never_leaves_the_pad_ends(method):
+    f = golden.reference('test.ovi').as_flight()
+    f.rocket.stages[0].weight *= 100
+    f.method = method
+    results = rasp.calc(f)
+    assert results.max_alt == 0.0 and results.t_rod == 0.0
+    results.display(io.StringIO(), verbose=True)
+
+
+SUMMARY = ('max_alt', 't_max_alt', 'max_vel', 't_max_vel', 't_rod', 't_coff',
+           'max_accel', 't_max_accel', 'min_accel', 't_min_accel')
+
+
+@pytest.mark.parametrize('airframe, motor', [('test.ovi', 'F50'), ('golden2.ovi', 'D12')])
+def test_record_modes_give_the_same_summary(airframe, motor):
+    runs = {record: rasp.calc(flight(motor, airframe, record=record, coast_base=2.0))
+            for record in rasp.RECORD_MODES}
+
+    full = runs['full']
+    reports = set()
+    for record, results in runs.items():
+        for name in SUMMARY:
+            assert getattr(results, name) == getattr(full, name), (record, name)
+        assert (results.vrod(), results.vcoff(), results.acoff(), results.amaxvel()) == \
+               (full.vrod(), full.vcoff(), full.acoff(), full.amaxvel()), record
+        assert results.events == full.events, record
+
+        fp = io.StringIO()
+        results.display(fp)
+        reports.add(fp.getvalue())
+    assert len(reports) == 1
+
+    assert len(runs['summary'].tee) == 0
+    tee = list(runs['decimated'].tee)
+    assert tee == pytest.approx([i * 0.1 for i in range(len(tee))], abs=1e-9)
+    assert tee[-1] == pytest.approx(full.tee[-1], abs=0.1)
+
+
+def test_stream_samples_are_the_full_trace():
+    f = flight(record='full', coast_base=2.0)
+    results = rasp.calc(f)
+    samples = list(rasp.simulate_stream(f))
+    assert [s.t for s in samples] == list(results.tee)
+    assert [s.alt for s in samples] == list(results.alt)
+    assert [s.thrust for s in samples] == list(results.thrust)
+
+
+def test_stream_can_stop_at_apogee():
+    f = flight(coast_base=30.0)
+    full = rasp.calc(f)
+
+    stream = rasp.simulate_stream(f)
+    taken = 0
+    for sample in stream:
+        taken += 1
+        if sample.vel < 0:
+            break
+    stream.close()
+    assert taken == round(full.t_max_alt / f.dt) + 2
+
+    assert rasp.apogee(f) == full.max_alt
@@ -0,0 +1,112 @@
+import os
+import json
+import shutil
+
+import pytest
+
+import golden
+import raspinfo
+
+EXTRA = """\
+X99         29          124    0-4              0.0400   0.0900   T
+             0.100      80.00
+             1.000      40.00
+             1.500       0.00
+"""
+
+
+@pytest.fixture
+def eng_file(tmp_path):
+    fname = str(tmp_path / 'rasp.eng')
+    shutil.copy(golden.ENG_FILE, fname)
+    return fname
+
+
+def touch_later(fname):
+    """ a new mtime even where the clock is coarse """
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+
+def same_motor(a, b):
+    assert (a.code, a.mfg, a.diam, a.dlen, a.m2, a.wt, a.delay) == (b.code, b.mfg, b.diam, b.dlen, b.m2, b.wt, b.delay)
+    assert [(p.t, p.thrust) for p in a.thrust] == [(p.t, p.thrust) for p in b.thrust]
+
+
+def test_read_motor_matches_load_engine(eng_file):
+    motors = raspinfo.load_engine(eng_file)
+    index = raspinfo.load_index(eng_file)
+    assert set(index) == set(motors)
+    for code, entry in index.items():
+        same_motor(raspinfo.read_motor(eng_file, entry.offset), motors[code])
+        e = motors[code]
+        assert entry[1:] == (e.diam, e.dlen, e.mfg, e.ntot(), e.wt, e.m2, e.npeak(), e.t2()), code
+
+
+def test_index_is_saved_and_reused(eng_file):
+    index = raspinfo.load_index(eng_file)
+    with open(eng_file + raspinfo.INDEX_EXT) as fp:
+        saved = json.load(fp)
+    assert set(saved['motors']) == set(index)
+
+    raspinfo._indexes.clear()
+    assert raspinfo.load_index(eng_file) == index
+
+
+def test_index_rebuilt_when_engine_file_changes(eng_file):
+    before = raspinfo.load_index(eng_file)
+    assert 'X99' not in before
+
+    with open(eng_file) as fp:
+        text = fp.read()
+    with open(eng_file, 'w') as fp:
+        fp.write(EXTRA + text)
+    touch_later(eng_file)
+
+    raspinfo._indexes.clear()
+    after = raspinfo.load_index(eng_file)
+    assert set(after) == set(before) | {'X99'}
+    assert after['X99'].offset == 0
+    assert after['F50'].offset == before['F50'].offset + len(EXTRA)
+
+    motor = raspinfo.read_motor(eng_file, after['F50'].offset)
+    same_motor(motor, raspinfo.load_engine(eng_file)['F50'])
+
+
+def test_catalog_retires_motors_of_an_edited_file(eng_file):
+    catalog = raspinfo.EngineCatalog()
+    first = catalog.get(eng_file, 'f50')
+    assert catalog.get(eng_file, 'F50') is first
+    assert (catalog.hits, catalog.misses) == (1, 1)
+
+    with open(eng_file) as fp:
+        text = fp.read()
+    with open(eng_file, 'w') as fp:
+        fp.write(EXTRA + text)
+    touch_later(eng_file)
+
+    again = catalog.get(eng_file, 'F50')
+    assert again is not first
+    same_motor(again, first)
+    assert catalog.get(eng_file, 'X99').npeak() == 80.0
+
+
+def scan_thrust(engine, t):
+    """ the linear scan Engine.get_thrust replaced """
+    prev_t = prev_thrust = 0.0
+    for node in engine.thrust:
+        if round(t, 3) <= round(node.t, 3):
+            if node.t == prev_t:
+                return node.thrust
+            return prev_thrust + (t - prev_t) / (node.t - prev_t) * (node.thrust - prev_thrust)
+        prev_t, prev_thrust = node.t, node.thrust
+    return 0.0
+
+
+def test_get_thrust_matches_a_scan_of_the_curve():
+    for code, engine in sorted(raspinfo.load_engine(golden.ENG_FILE).items()):
+        times = [i * 0.001 for i in range(0, int(engine.t2() * 1000) + 20, 3)]
+        times += [node.t for node in engine.thrust]
+        want = [scan_thrust(engine, t) for t in times]
+        assert [engine.get_thrust(t) for t in times] == want, code
+        assert list(engine.get_thrust_array(times)) == want, code
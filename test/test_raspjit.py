@@ -0,0 +1,57 @@
+import copy
+
+import pytest
+
+import golden
+import rasp
+
+raspjit = pytest.importorskip('raspjit')
+if not raspjit.enabled:
+    pytest.skip("numba is not installed", allow_module_level=True)
+
+
+def flight(airframe, motor):
+    rkt = copy.deepcopy(golden.reference(airframe))
+    rkt.stages[-1].enginefile = golden.ENG_FILE
+    rkt.stages[-1].motorname = motor
+    return rkt.as_flight()
+
+
+@pytest.mark.parametrize('airframe, motor', [
+    ('test.ovi', 'F50'),
+    ('test.ovi', 'G40'),
+    ('test.ovi', 'A3'),         # never leaves the pad
+    ('golden2.ovi', 'D12'),
+    ('golden3.ovi', 'C6'),
+])
+def test_parity(airframe, motor):
+    diffs, _, _ = raspjit.parity(flight(airframe, motor))
+    assert diffs == []
+
+
+def test_calc_does_not_depend_on_history(monkeypatch):
+    calls = []
+    monkeypatch.delenv('RASP_NOJIT', raising=False)
+    monkeypatch.setattr(raspjit, 'calc', lambda f: calls.append(f))
+
+    f = flight('test.ovi', 'F50')
+    f.record = 'summary'
+    first = rasp.calc(f).max_alt
+    for _ in range(rasp.JIT_AFTER + 1):
+        assert rasp.calc(f).max_alt == first
+    assert calls == []
+
+    f.compiled = True
+    rasp.calc(f)
+    assert calls == [f]
+
+
+def test_compiled_flag_gives_the_same_summary(monkeypatch):
+    monkeypatch.delenv('RASP_NOJIT', raising=False)
+    f = flight('test.ovi', 'G40')
+    f.record = 'summary'
+    python = rasp.calc(f)
+    f.compiled = True
+    kernel = rasp.calc(f)
+    for name in raspjit.PARITY_FIELDS:
+        assert getattr(kernel, name) == getattr(python, name), name
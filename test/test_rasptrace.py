@@ -0,0 +1,64 @@
+import pytest
+
+import golden
+import nc
+import rasp
+import rasptrace
+import test_nc
+
+
+def flown():
+    flight = golden.reference('test.ovi').as_flight()
+    flight.record = 'full'
+    return flight, rasp.calc(flight)
+
+
+@pytest.mark.parametrize('typecode', ['d', 'f'])
+def test_round_trip(tmp_path, typecode):
+    flight, results = flown()
+    fname = str(tmp_path / ('trace' + rasptrace.EXT))
+    rasptrace.write(fname, flight, results, typecode)
+
+    with rasptrace.Trace(fname) as trace:
+        assert trace.rows == len(results.tee) > 0
+        assert trace.names == [name for name, _, _ in rasptrace.COLUMNS]
+        assert trace.meta['typecode'] == typecode
+        assert trace.meta['summary']['max_alt'] == results.max_alt
+        assert trace.meta['events'] == [[t, desc] for t, desc in results.events]
+        assert trace.meta['motors'][0]['code'] == flight.e_info[0].code
+
+        rel = 0.0 if typecode == 'd' else 1e-6
+        for name, attr, _ in rasptrace.COLUMNS:
+            assert list(trace[name]) == pytest.approx(list(getattr(results, attr)), rel=rel, abs=rel), name
+
+
+def test_round_trip_without_numpy(tmp_path, monkeypatch):
+    flight, results = flown()
+    fname = str(tmp_path / ('trace' + rasptrace.EXT))
+    rasptrace.write(fname, flight, results)
+
+    monkeypatch.setattr(rasptrace, 'np', None)
+    with rasptrace.Trace(fname) as trace:
+        alt = trace.column('alt')
+        assert list(alt) == list(results.alt)
+        del alt
+
+
+def test_not_a_trace(tmp_path):
+    fname = tmp_path / 'junk.rtr'
+    fname.write_bytes(b'not a trace file at all')
+    with pytest.raises(ValueError, match='not a RASP trace'):
+        rasptrace.Trace(str(fname))
+
+
+def test_trace_overrides_record_summary(tmp_path, monkeypatch, capsys):
+    deck = test_nc.deck(tmp_path, "MotorName F50\nRecord summary\nTrace float\nOutFile traced\nLaunch\n")
+    monkeypatch.chdir(tmp_path)
+    nc.batch_flite(deck)
+
+    with rasptrace.Trace(str(tmp_path / ('traced' + rasptrace.EXT))) as trace:
+        assert trace.meta['integrator']['record'] == 'full'
+        assert trace.rows > 1
+        t = trace['t']
+        assert t[0] == 0.0 and t[trace.rows - 1] > 1.0
+        del t
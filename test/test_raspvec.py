@@ -0,0 +1,58 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import golden
+import raspinfo
+import raspvec
+
+
+def catalog():
+    return [raspinfo.find_motor(golden.ENG_FILE, code) for code in sorted(raspinfo.load_engine(golden.ENG_FILE))]
+
+
+# a sample of the catalog, A to H: short and long burns, curves starting after t=0,
+# motors too heavy for an airframe; the thrust table test has every motor
+MOTORS = ('1/4A3', 'A10', 'B6', 'C6', 'D12', 'E60', 'F50', 'F100', 'G40', 'G60FSUSR', 'H97', 'H640USR')
+
+
+def flights(airframe):
+    return [f for f in (golden.flight_for(airframe, m) for m in MOTORS) if f is not None]
+
+
+def test_thrust_table_matches_engine():
+    engines = catalog()
+    table = raspvec.ThrustTable()
+    for engine in engines:
+        table.add(engine)
+    table.build()
+
+    for engine in engines:
+        # the integrators ask at multiples of the time step, get_thrust rounds to the ms
+        t = np.arange(-10, round((engine.t2() + 0.5) / 0.001), 7) * 0.001
+        nodes = np.array(engine.times)
+        t = np.concatenate([t, nodes - 0.001, nodes, nodes + 0.001])
+        eng = np.full(len(t), table.index(engine))
+
+        thrust, impulse = table.thrust_impulse(eng, t)
+        want = [engine.get_thrust(x) if x >= 0.0 else 0.0 for x in t]
+        assert thrust == pytest.approx(want, rel=1e-12, abs=1e-9), engine.code
+
+        want = [engine.impulse(x) if x >= 0.0 else 0.0 for x in t]
+        assert impulse == pytest.approx(want, rel=1e-12, abs=1e-9), engine.code
+
+
+def test_compare_motor_sample():
+    worst = raspvec.compare(flights('test.ovi'), fields=raspvec.SUMMARY_FIELDS)
+    assert max(worst.values()) <= raspvec.BATCH_RTOL, worst
+
+
+@pytest.mark.parametrize('airframe', ['golden2.ovi', 'golden3.ovi'])
+def test_staged_batch_matches_corpus(airframe):
+    corpus = golden.read_corpus(golden.CORPUS)
+    batch = flights(airframe)
+    for flight, summary in zip(batch, raspvec.calc_batch(batch)):
+        want = corpus[(airframe, flight.e_info[-1].code)]
+        for name in golden.FIELDS:
+            assert getattr(summary, name) == pytest.approx(want[name], rel=raspvec.BATCH_RTOL, abs=1e-9), \
+                (flight.e_info[-1].code, name)